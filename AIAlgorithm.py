@@ -1,9 +1,85 @@
 import random
 import math
-import copy
+import time
+import functools
+import numpy as np
+from Bitboard import Bitboard, WINDOWS, NUM_WINDOWS, WINDOW_MASKS, CENTER_MASK, ZOBRIST_SIDE, HEIGHT, NUM_ROWS, \
+    NUM_COLUMNS, popcount, WINDOW_CELL_INDICES, CELL_WINDOW_INDICES, WINDOW_SCORES, CENTER_WEIGHT
+from ScoredBitboard import ScoredBitboard
+from TranspositionTable import TranspositionTable, SlotTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from MCTSNode import MCTSNode
+from ParallelMCTS import ParallelMCTS
+from SearchStats import SearchStats
+from OpeningBook import open_book
+
+# scores of a won or lost position, anything this large is a proven result rather than a heuristic
+WIN_SCORE = 1000000
+# static move order, center columns take part in the most lines so they are tried first
+CENTER_OUT_ORDER = [3, 2, 4, 1, 5, 0, 6]
+# half-width of the first aspiration window around the previous iteration's score, widened on failure
+ASPIRATION_WINDOW = 16
+# SlotTables of solved endgame positions by memory cap in MB, shared by the AIAlgorithms of the process;
+# entries are (key, lower bound, upper bound) of the exact score, key being the hash with the side to move mixed in
+ENDGAME_CACHES = {}
+# a solver entry holds three items where a transposition table entry holds six
+ENDGAME_ENTRY_BYTES = 128
+# the four cells of every window through each cell, for vectorized win checks on flattened boards
+CELL_WINDOW_CELLS = WINDOW_CELL_INDICES[CELL_WINDOW_INDICES]
+# the four cells of each of the 69 windows and the center column cells, on flattened 6x7 boards
+BOARD_WINDOW_CELLS = WINDOW_CELL_INDICES[:NUM_WINDOWS]
+CENTER_CELLS = np.arange(NUM_ROWS) * NUM_COLUMNS + NUM_COLUMNS // 2
+WINDOW_SCORE_ARRAY = np.array(WINDOW_SCORES)
+# boards evaluate_boards works on at a time, a few MB of window counts per chunk
+EVALUATION_CHUNK_SIZE = 65536
+# weight of the exploration term in UCB1
+MCTS_EXPLORATION = math.sqrt(2)
+# how many nodes the search visits between two looks at the clock, a few ms at 35-110k nodes/s so even
+# small time budgets are kept; a look at the clock costs far less than the 128 nodes between them
+CLOCK_CHECK_INTERVAL = 128
+# most random games MCTS pondering plays on the opponent's time, which caps the memory of the tree it grows
+PONDER_PLAYOUTS = 200000
+
+
+class SearchTimeout(Exception):
+    """Raised inside a timed search when its time budget runs out"""
+
+
+class SearchCancelled(Exception):
+    """Raised inside a search after cancel_search was called, the search is abandoned without a move"""
+
+
+def records_search_stats(algorithm):
+    """
+    Decorator for the search entry points: the outermost decorated call collects a SearchStats of its work
+    into last_search_stats, searches it calls on the way (e.g. search handing over to the endgame solver)
+    add to the same stats
+    Args:
+        algorithm: name the stats are recorded under
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, board, *args, **kwargs):
+            if self.search_stats is not None:
+                return method(self, board, *args, **kwargs)
+            self.begin_search_stats(algorithm, board)
+            try:
+                return method(self, board, *args, **kwargs)
+            finally:
+                self.finish_search_stats()
+        return wrapper
+    return decorator
+
+
+def get_endgame_cache(max_memory_mb):
+    """Solver cache shared by the AIAlgorithms of this process capped at max_memory_mb"""
+    if max_memory_mb not in ENDGAME_CACHES:
+        ENDGAME_CACHES[max_memory_mb] = SlotTable(max_memory_mb, ENDGAME_ENTRY_BYTES)
+    return ENDGAME_CACHES[max_memory_mb]
+
 
 class AIAlgorithm:
-    def __init__(self, ai_piece, player_piece):
+    def __init__(self, ai_piece, player_piece, transposition_table_mb=16, endgame_threshold=12,
+                 opening_book_path=None, endgame_cache_mb=16):
         # AI's piece identifier (typically 2)
         self.AI_PIECE = ai_piece
         # Player's piece identifier (typically 1)
@@ -14,13 +90,125 @@ class AIAlgorithm:
         self.num_columns = 7
         self.winning_pieces = []
         self.game_over = False
+        # minimax results kept across the moves of a game, memory capped at transposition_table_mb
+        self.transposition_table = TranspositionTable(transposition_table_mb)
+        # nodes visited by minimax and, during a timed search, when to stop
+        self.nodes = 0
+        self.deadline = None
+        # set from another thread to abandon the running search
+        self.cancel_requested = False
+        # running totals of the work done by every search, SearchStats of a move are the difference over it
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.playouts = 0
+        self.early_terminations = 0
+        # most moves on the board at any node of the current search
+        self.deepest_moves = 0
+        # stats of the search in progress and of the last finished one
+        self.search_stats = None
+        self.last_search_stats = None
+        # depth of the last completed iteration of search
+        self.search_depth = 0
+        # move ordering: two killer columns per ply and a history score per piece and cell
+        self.killers = [[None, None] for _ in range(self.num_rows * self.num_columns + 1)]
+        self.history = [[0] * (self.num_columns * HEIGHT) for _ in range(3)]
+        # medium difficulty picks randomly between root moves with the same score
+        self.randomize_ties = True
+        # with this many empty cells or fewer positions are solved exactly instead of searched;
+        # the "weak" solver only tells win, draw or loss, the "strong" one also finds the fastest win
+        self.endgame_threshold = endgame_threshold
+        self.endgame_mode = "strong"
+        # solver results, memory capped at endgame_cache_mb and shared with the other AIAlgorithms of the process
+        self.endgame_cache = get_endgame_cache(endgame_cache_mb)
+        # random games played per MCTS iteration, above 1 they are run together by batched_playouts
+        self.playout_batch_size = 1
+        # with more than one worker MCTS runs on a pool of worker processes, in "root" or "tree" parallel mode
+        self.mcts_workers = 1
+        self.mcts_parallel_mode = "root"
+        self.parallel_mcts = None
+        # UCT tree of the last monte_carlo_tree_search and the moves of the position at its root
+        self.mcts_root = None
+        self.mcts_root_moves = []
+        # best moves of the early positions searched offline by OpeningBook.py, only with an opening_book_path
+        self.opening_book = open_book(opening_book_path) if opening_book_path else None
+        # PositionCache of finished searches shared with earlier runs, off unless set (see PositionCache.open_cache)
+        self.position_cache = None
+
+    def new_game(self):
+        """Forget search results from the previous game"""
+        self.transposition_table.clear()
+        self.killers = [[None, None] for _ in range(self.num_rows * self.num_columns + 1)]
+        self.history = [[0] * (self.num_columns * HEIGHT) for _ in range(3)]
+        self.mcts_root = None
+        self.mcts_root_moves = []
+
+    def begin_search_stats(self, algorithm, board):
+        """Start collecting SearchStats for a search from board"""
+        table = self.transposition_table
+        self.search_stats = SearchStats(algorithm)
+        self.stats_start_moves = self.deepest_moves = self.to_position(board).num_moves
+        self.stats_start = (self.nodes, self.cutoffs, self.first_move_cutoffs, self.playouts,
+                            self.early_terminations, table.hits, table.hits + table.misses, time.perf_counter())
+
+    def finish_search_stats(self):
+        """Fill in the SearchStats of the search that just ended and move them to last_search_stats"""
+        table = self.transposition_table
+        stats = self.search_stats
+        nodes, cutoffs, first_move_cutoffs, playouts, early_terminations, hits, probes, start_time = self.stats_start
+        stats.wall_time_ms = (time.perf_counter() - start_time) * 1000
+        stats.nodes = self.nodes - nodes
+        stats.cutoffs = self.cutoffs - cutoffs
+        stats.first_move_cutoffs = self.first_move_cutoffs - first_move_cutoffs
+        stats.playouts = self.playouts - playouts
+        stats.early_terminations = self.early_terminations - early_terminations
+        stats.tt_hits = table.hits - hits
+        stats.tt_probes = table.hits + table.misses - probes
+        stats.max_depth = self.deepest_moves - self.stats_start_moves
+        self.last_search_stats = stats
+        self.search_stats = None
+
+    def cancel_search(self):
+        """
+        Ask the search running on another thread to stop, it raises SearchCancelled within CLOCK_CHECK_INTERVAL
+        nodes or one MCTS iteration; the caller clears cancel_requested once the search has stopped
+        """
+        self.cancel_requested = True
+
+    def check_clock(self):
+        """Stop the running search if it was cancelled or its time budget ran out"""
+        if self.cancel_requested:
+            raise SearchCancelled()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
+    def to_position(self, board):
+        """
+        Conversion layer between the NumPy boards used by the game and the Bitboard the search runs on
+        """
+        if isinstance(board, Bitboard):
+            return board
+        return Bitboard.from_array(board)
+
+    def to_scored_position(self, board):
+        """
+        ScoredBitboard copy of a board for the alpha-beta searches, which score their leaves from its running
+        heuristic; the caller's board is left untouched
+        """
+        position = self.to_position(board)
+        if isinstance(position, ScoredBitboard):
+            return position
+        return ScoredBitboard.from_position(position)
 
     def is_valid_location(self, board, col):
+        if isinstance(board, Bitboard):
+            return board.can_play(col)
         # A column is valid if the top row (row index 5) is empty
         return board[5][col] == 0
 
     # return a list of all valid columns where a move can be made
     def get_valid_locations(self, board):
+        if isinstance(board, Bitboard):
+            return board.valid_moves()
         return [col for col in range(7) if self.is_valid_location(board, col)]
 
     def drop_piece(self, board, row, col, piece):
@@ -30,306 +218,922 @@ class AIAlgorithm:
         '''
         evaluates the board position for the given piece - higher score means better move
         '''
-        score = 0
-        opponent_piece = self.PLAYER_PIECE if piece == self.AI_PIECE else self.AI_PIECE
+        if isinstance(board, Bitboard):
+            return self.score_bitboard(board, piece)
 
-        # Score center column (preferable to control center)
-        center_array = [board[r][3] for r in range(6)]
-        center_count = center_array.count(piece)
-        score += center_count * 3
-
-        # Score horizontal positions
-        for r in range(6):
-            row_array = list(board[r])
-            for c in range(4):
-                window = row_array[c:c + 4]
-                score += self.evaluate_window(window, piece, opponent_piece)
-
-        # Score vertical positions
-        for c in range(7):
-            col_array = [board[r][c] for r in range(6)]
-            for r in range(3):
-                window = col_array[r:r + 4]
-                score += self.evaluate_window(window, piece, opponent_piece)
-
-        # Score positive diagonal positions
-        for r in range(3):
-            for c in range(4):
-                window = [board[r + i][c + i] for i in range(4)]
-                score += self.evaluate_window(window, piece, opponent_piece)
-
-        # Score negative diagonal positions
-        for r in range(3):
-            for c in range(4):
-                window = [board[5 - r - i][c + i] for i in range(4)]
-                score += self.evaluate_window(window, piece, opponent_piece)
+        # one gather of every window's cells from the flattened board, then a count per window
+        cells = np.asarray(board).reshape(-1) == piece
+        score = int(cells[CENTER_CELLS].sum()) * CENTER_WEIGHT  # center column (preferable to control center)
+        return score + int(WINDOW_SCORE_ARRAY[cells[BOARD_WINDOW_CELLS].sum(axis=1)].sum())
 
+    def score_bitboard(self, position, piece):
+        """
+        score_position for a Bitboard: same weights, counting each window with a popcount,
+        or read straight from the running score of a ScoredBitboard
+        """
+        if isinstance(position, ScoredBitboard):
+            return position.scores[piece]
+        mask = position.masks[piece]
+        score = popcount(mask & CENTER_MASK) * CENTER_WEIGHT
+        for window in WINDOW_MASKS:
+            score += WINDOW_SCORES[popcount(mask & window)]
         return score
 
+    def evaluate_boards(self, boards, piece=None, chunk_size=EVALUATION_CHUNK_SIZE):
+        '''
+        score_position and the game result for a whole stack of boards at once, for offline analysis of
+        many positions: the discs of every window are counted by adding shifted slices of the stacked boards
+        along each direction, like a convolution with a line of four ones, instead of one call per board.
+        :param boards: (N, 6, 7) array or sequence of NumPy boards
+        :param piece: piece to score the boards for, the AI's by default
+        :param chunk_size: boards evaluated together, bounding the memory used for large N
+        :return: (scores, winners, terminal) arrays of length N: the score_position heuristic for piece,
+            the piece with four in a row (0 if none) and whether the game is over (won or full board)
+        '''
+        piece = self.AI_PIECE if piece is None else piece
+        boards = np.asarray(boards).reshape(-1, self.num_rows, self.num_columns)
+        scores = np.empty(len(boards), dtype=np.int64)
+        winners = np.zeros(len(boards), dtype=np.int8)
+        terminal = np.empty(len(boards), dtype=bool)
+        for start in range(0, len(boards), chunk_size):
+            chunk = boards[start:start + chunk_size]
+            end = start + len(chunk)
+            counts = self.window_counts(chunk == piece)
+            scores[start:end] = (chunk[:, :, self.num_columns // 2] == piece).sum(axis=1) * CENTER_WEIGHT \
+                + WINDOW_SCORE_ARRAY[counts].sum(axis=1)
+            for other in (self.PLAYER_PIECE, self.AI_PIECE):
+                other_counts = counts if other == piece else self.window_counts(chunk == other)
+                winners[start:end][(other_counts == 4).any(axis=1)] = other
+            terminal[start:end] = (winners[start:end] != 0) | (chunk != self.EMPTY).all(axis=(1, 2))
+        return scores, winners, terminal
+
+    def window_counts(self, cells):
+        """
+        Number of marked cells in every window of a stack of boards
+        Args:
+            cells: (N, 6, 7) bool array
+        Returns: (N, 69) int8 array, the sums of four consecutive cells along rows, columns and both diagonals
+        """
+        cells = cells.astype(np.int8)
+        rows, columns = self.num_rows, self.num_columns
+        horizontal = cells[:, :, 0:columns - 3] + cells[:, :, 1:columns - 2] \
+            + cells[:, :, 2:columns - 1] + cells[:, :, 3:columns]
+        vertical = cells[:, 0:rows - 3] + cells[:, 1:rows - 2] + cells[:, 2:rows - 1] + cells[:, 3:rows]
+        diagonal = cells[:, 0:rows - 3, 0:columns - 3] + cells[:, 1:rows - 2, 1:columns - 2] \
+            + cells[:, 2:rows - 1, 2:columns - 1] + cells[:, 3:rows, 3:columns]
+        anti_diagonal = cells[:, 3:rows, 0:columns - 3] + cells[:, 2:rows - 1, 1:columns - 2] \
+            + cells[:, 1:rows - 2, 2:columns - 1] + cells[:, 0:rows - 3, 3:columns]
+        return np.concatenate([window_sums.reshape(len(cells), -1)
+                               for window_sums in (horizontal, vertical, diagonal, anti_diagonal)], axis=1)
+
     def evaluate_window(self, window, piece, opponent_piece):
         """
         Helper method to evaluate a window of 4 positions.
         """
-        score = 0
-        # Count pieces
-        piece_count = window.count(piece)
-
-        # Score window based on piece counts
-        if piece_count == 4:
-            score += 100  # Winning position
-        elif piece_count == 3:
-            score += 3
-        elif piece_count == 2:
-            score += 1
-
-        return score
+        # Score window based on piece counts: 100 for four (winning position), 3 for three, 1 for two
+        return WINDOW_SCORES[window.count(piece)]
 
     def is_terminal(self, board):
         """Check if the current position is terminal (game over)"""
+        position = self.to_position(board)
         # Check for win
-        if self.check_win(board, self.PLAYER_PIECE, self.num_columns, self.num_rows):
-            return True
-        if self.check_win(board, self.AI_PIECE, self.num_columns, self.num_rows):
+        if position.has_won(self.PLAYER_PIECE) or position.has_won(self.AI_PIECE):
             return True
 
         # Check if board is full
-        return len(self.get_valid_locations(board)) == 0
+        return position.is_full()
 
+    @records_search_stats("minimax")
     def minimax(self, board, depth, alpha, beta, maximizing_player):
         '''
         Minmax for medium difficulty
         return: (column, score)
         '''
-        valid_locations = self.get_valid_locations(board)
+        position = self.to_scored_position(board)
+
+        # Only the starting position needs a full win check, every move made during the search
+        # is checked through its own cell as soon as it is played
+        if self.is_terminal(position):
+            if position.has_won(self.AI_PIECE):
+                return (None, WIN_SCORE)  # AI win
+            elif position.has_won(self.PLAYER_PIECE):
+                return (None, -WIN_SCORE)  # Player win
+            else:
+                return (None, 0)  # Draw
+
+        if self.is_endgame(position):
+            col, score = self.solve_endgame(position, self.AI_PIECE if maximizing_player else self.PLAYER_PIECE)
+            return col, score if maximizing_player else -score
+
+        self.transposition_table.new_search()
+        self.search_stats.depth = depth
+        return self._minimax(position, depth, alpha, beta, maximizing_player)
+
+    @records_search_stats("pvs")
+    def pvs(self, board, depth, alpha, beta, maximizing_player):
+        '''
+        Principal variation search, a negamax drop-in for minimax with the same arguments and results
+        return: (column, score), score from the AI's point of view like minimax
+        '''
+        position = self.to_scored_position(board)
+        if self.is_terminal(position):
+            return self.minimax(position, 0, alpha, beta, maximizing_player)
+
+        if self.is_endgame(position):
+            col, score = self.solve_endgame(position, self.AI_PIECE if maximizing_player else self.PLAYER_PIECE)
+            return col, score if maximizing_player else -score
+
+        self.transposition_table.new_search()
+        self.search_stats.depth = depth
+        if maximizing_player:
+            return self._pvs(position, depth, alpha, beta, self.AI_PIECE)
+        col, score = self._pvs(position, depth, -beta, -alpha, self.PLAYER_PIECE)
+        return col, -score
+
+    @records_search_stats("minimax")
+    def search(self, board, time_budget_ms, max_depth=None, algorithm="minimax"):
+        '''
+        Anytime search for the AI's move: searches depth 1, 2, 3... until the time budget runs out, or solves
+        the position exactly under the same budget once it is within endgame_threshold cells of the end.
+        Each iteration leaves its best line in the transposition table, so the next one tries it first.
+        :param board: current game board
+        :param time_budget_ms: wall-clock time the search may take, in milliseconds
+        :param max_depth: optional depth to stop deepening at
+        :param algorithm: "minimax" for plain alpha-beta, "pvs" for principal variation search
+            with aspiration windows around the previous iteration's score
+        :return: (column, score) of the deepest completed iteration
+        '''
+        start_time = time.perf_counter()
+        position = self.to_scored_position(board)
+        start_moves = position.num_moves
+        self.search_stats.algorithm = algorithm
+
+        if self.is_terminal(position):
+            return self.minimax(position, 0, -math.inf, math.inf, True)
+
+        book_entry = self.book_move(position)
+        if book_entry is not None:
+            return book_entry
+
+        budget = f"{algorithm}:{time_budget_ms}ms:{max_depth}"
+        cached = self.cached_search(position, budget)
+        if cached is not None:
+            return cached
+
+        empty_cells = self.num_rows * self.num_columns - start_moves
+        max_depth = empty_cells if max_depth is None else min(max_depth, empty_cells)
+
+        self.transposition_table.new_search()
+        self.deadline = start_time + time_budget_ms / 1000
+        # fall back to the most central legal move if not even depth 1 or the solver finishes in time
+        best_col, best_score = next(col for col in CENTER_OUT_ORDER if position.can_play(col)), 0
+        self.search_depth = 0
+        try:
+            if empty_cells <= self.endgame_threshold:
+                # the solver runs under the same deadline, every depth below the root would call it anyway
+                best_col, best_score = self.solve_endgame(position)
+                self.search_depth = empty_cells
+            else:
+                for depth in range(1, max_depth + 1):
+                    if algorithm == "pvs":
+                        best_col, best_score = self.aspiration_search(position, depth,
+                                                                      best_score if depth > 1 else None)
+                    else:
+                        best_col, best_score = self._minimax(position, depth, -math.inf, math.inf, True)
+                    self.search_depth = depth
+                    # a proven win or loss does not change with more depth
+                    if abs(best_score) >= WIN_SCORE:
+                        break
+        except SearchTimeout:
+            # the timeout unwinds the search without taking its moves back
+            position.undo_to(start_moves)
+            self.search_stats.timed_out = True
+        finally:
+            self.deadline = None
+        self.search_stats.depth = self.search_depth
+        return self.cache_search(position, budget, (best_col, best_score))
+
+    def aspiration_search(self, position, depth, guess):
+        '''
+        PVS at the root with a narrow window around a guessed score, widening it on the failing side
+        until the score falls inside
+        :param guess: expected score, usually the previous iteration's, or None to search the full window
+        return: (column, score)
+        '''
+        if guess is None:
+            return self._pvs(position, depth, -math.inf, math.inf, self.AI_PIECE)
+
+        low_delta = high_delta = ASPIRATION_WINDOW
+        while True:
+            alpha = guess - low_delta if low_delta < WIN_SCORE else -math.inf
+            beta = guess + high_delta if high_delta < WIN_SCORE else math.inf
+            col, score = self._pvs(position, depth, alpha, beta, self.AI_PIECE)
+            if score <= alpha:
+                low_delta *= 4
+            elif score >= beta:
+                high_delta *= 4
+            else:
+                return col, score
+
+    def _pvs(self, position, depth, alpha, beta, piece, ply=0):
+        '''
+        Negamax principal variation search: the first move is searched with the full window, the rest
+        with a null window that only proves they are no better, re-searching fully when one fails high.
+        position is a ScoredBitboard, see to_scored_position
+        return: (column, score), score from the point of view of piece, the side to move
+        '''
+        self.nodes += 1
+        if self.nodes % CLOCK_CHECK_INTERVAL == 0:
+            self.check_clock()
+        if position.num_moves > self.deepest_moves:
+            self.deepest_moves = position.num_moves
+
+        # the transposition table holds scores from the AI's point of view, shared with minimax
+        sign = 1 if piece == self.AI_PIECE else -1
+
+        # Draw or max depth reached
+        if position.is_full():
+            self.early_terminations += 1
+            return (None, 0)
+        if self.is_endgame(position):
+            return (None, self.solved_score(position, piece))
+        if depth == 0:
+            return (None, sign * position.scores[self.AI_PIECE])
+
+        key = position.hash if sign > 0 else position.hash ^ ZOBRIST_SIDE
+        entry = self.transposition_table.lookup(key)
+        if entry is not None and entry[0] >= depth and ply > 0:
+            _, bound, score, move = entry
+            score *= sign
+            # seen from the other side a lower bound becomes an upper bound
+            if sign < 0 and bound != EXACT:
+                bound = LOWER_BOUND if bound == UPPER_BOUND else UPPER_BOUND
+            if bound == EXACT:
+                return move, score
+            if bound == LOWER_BOUND:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return move, score
+        alpha_original, beta_original = alpha, beta
+
+        opponent_piece = self.PLAYER_PIECE if piece == self.AI_PIECE else self.AI_PIECE
+        valid_locations = self.order_moves(position, entry[3] if entry is not None else None, ply, piece)
+        # same root tie-breaking as minimax: probes use a window just below the best score
+        break_ties = ply == 0 and self.randomize_ties
+        tied_cols = []
+
+        value, best_col = -math.inf, valid_locations[0]
+        for col in valid_locations:
+            position.play(col, piece)
+            if position.last_move_wins():
+                position.undo()
+                self.early_terminations += 1
+                return (col, WIN_SCORE)
+
+            if value == -math.inf:
+                score = -self._pvs(position, depth - 1, -beta, -alpha, opponent_piece, ply + 1)[1]
+            else:
+                probe_alpha = min(alpha, value - 1) if break_ties else alpha
+                score = -self._pvs(position, depth - 1, -probe_alpha - 1, -probe_alpha, opponent_piece, ply + 1)[1]
+                # failing high on the null window means the move may be better: get its real score
+                if probe_alpha < score < beta:
+                    score = -self._pvs(position, depth - 1, -beta, -probe_alpha, opponent_piece, ply + 1)[1]
+            position.undo()
+
+            if score > value:
+                value, best_col = score, col
+                tied_cols = [col]
+            elif score == value:
+                tied_cols.append(col)
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.record_cutoff(position, col, piece, depth, ply, col == valid_locations[0])
+                break
+
+        if break_ties:
+            best_col = random.choice(tied_cols)
+        if sign > 0:
+            self.store_result(key, depth, alpha_original, beta_original, best_col, value)
+        else:
+            self.store_result(key, depth, -beta_original, -alpha_original, best_col, -value)
+        return best_col, value
+
+    def _minimax(self, position, depth, alpha, beta, maximizing_player, ply=0):
+        '''
+        Alpha-beta search below the root. Positions reaching here never hold a four in a row,
+        since a winning move returns straight away in the parent. position is a ScoredBitboard,
+        see to_scored_position
+        return: (column, score)
+        '''
+        self.nodes += 1
+        if self.nodes % CLOCK_CHECK_INTERVAL == 0:
+            self.check_clock()
+        if position.num_moves > self.deepest_moves:
+            self.deepest_moves = position.num_moves
 
-        # Terminal node or max depth reached
-        if depth == 0 or self.is_terminal(board):
-            if self.is_terminal(board):
-                # Terminal scoring
-                if self.check_win(board, self.AI_PIECE, self.num_columns, self.num_rows):
-                    return (None, 1000000)  # AI win
-                elif self.check_win(board, self.PLAYER_PIECE, self.num_columns, self.num_rows):
-                    return (None, -1000000)  # Player win
-                else:
-                    return (None, 0)  # Draw
+        # Draw or max depth reached
+        if position.is_full():
+            self.early_terminations += 1
+            return (None, 0)
+        if self.is_endgame(position):
+            # exact result instead of a heuristic close to the end of the game
+            score = self.solved_score(position, self.AI_PIECE if maximizing_player else self.PLAYER_PIECE)
+            return (None, score if maximizing_player else -score)
+        if depth == 0:
+            # Heuristic scoring at max depth, kept up to date by the ScoredBitboard on every move
+            return (None, position.scores[self.AI_PIECE])
+
+        # the same cells with the other side to move are a different position
+        key = position.hash if maximizing_player else position.hash ^ ZOBRIST_SIDE
+        entry = self.transposition_table.lookup(key)
+        # the root always searches its moves so it can choose between equally good ones
+        if entry is not None and entry[0] >= depth and ply > 0:
+            _, bound, score, move = entry
+            if bound == EXACT:
+                return move, score
+            if bound == LOWER_BOUND:
+                alpha = max(alpha, score)
             else:
-                # Heuristic scoring at max depth
-                return (None, self.score_position(board, self.AI_PIECE))
+                beta = min(beta, score)
+            if alpha >= beta:
+                return move, score
+        alpha_original, beta_original = alpha, beta
 
-        # Introduce some randomness for medium difficulty
-        valid_locations = sorted(valid_locations, key=lambda x: 0.1 * random.random())
+        piece = self.AI_PIECE if maximizing_player else self.PLAYER_PIECE
+        valid_locations = self.order_moves(position, entry[3] if entry is not None else None, ply, piece)
+        # Medium difficulty randomness: at the root, moves that tie the best score are searched with a window
+        # just past it so the tie is exact, and one of the tied moves is picked at random
+        break_ties = ply == 0 and self.randomize_ties
+        tied_cols = []
 
         # Maximizing player (AI)
         if maximizing_player:
-            value, best_col = -math.inf, random.choice(valid_locations)
+            value, best_col = -math.inf, valid_locations[0]
             for col in valid_locations:
-                # find the available row
-                row = next(r for r in range(6) if board[r][col] == 0)
-                temp_board = copy.deepcopy(board)
-                # simulate the move
-                self.drop_piece(temp_board, row, col, self.AI_PIECE)
+                # simulate the move in place, it is taken back before trying the next column
+                position.play(col, self.AI_PIECE)
 
                 # Check for immediate win (depth-1 optimization)
-                if self.check_win(temp_board, self.AI_PIECE, self.num_columns, self.num_rows):
-                    return (col, 1000000)
+                if position.last_move_wins():
+                    position.undo()
+                    self.early_terminations += 1
+                    return (col, WIN_SCORE)
 
                 # recursively call minimax with the next move from player1
-                new_score = self.minimax(temp_board, depth - 1, alpha, beta, False)[1]
+                child_alpha = min(alpha, value - 1) if break_ties and value > -math.inf else alpha
+                new_score = self._minimax(position, depth - 1, child_alpha, beta, False, ply + 1)[1]
+                position.undo()
 
-                # introduce randomness to decisions
-                if new_score > value or (new_score == value and random.random() < 0.3):
+                if new_score > value:
                     value, best_col = new_score, col
+                    tied_cols = [col]
+                elif new_score == value:
+                    tied_cols.append(col)
 
                 # alpha-beta pruning
                 alpha = max(alpha, value)
                 # prune the search tree
                 if alpha >= beta:
+                    self.record_cutoff(position, col, piece, depth, ply, col == valid_locations[0])
                     break
-            return best_col, value
 
         # minimize the player1's best possible move
         else:
-            value, best_col = math.inf, random.choice(valid_locations)
+            value, best_col = math.inf, valid_locations[0]
 
             for col in valid_locations:
-                row = next(r for r in range(6) if board[r][col] == 0)
-                temp_board = copy.deepcopy(board)
-                self.drop_piece(temp_board, row, col, self.PLAYER_PIECE)
+                position.play(col, self.PLAYER_PIECE)
 
                 # Check for immediate loss (depth-1 optimization)
-                if self.check_win(temp_board, self.PLAYER_PIECE, self.num_columns, self.num_rows):
-                    return (col, -1000000)
+                if position.last_move_wins():
+                    position.undo()
+                    self.early_terminations += 1
+                    return (col, -WIN_SCORE)
 
-                new_score = self.minimax(temp_board, depth - 1, alpha, beta, True)[1]
+                child_beta = max(beta, value + 1) if break_ties and value < math.inf else beta
+                new_score = self._minimax(position, depth - 1, alpha, child_beta, True, ply + 1)[1]
+                position.undo()
                 if new_score < value:
                     value, best_col = new_score, col
+                    tied_cols = [col]
+                elif new_score == value:
+                    tied_cols.append(col)
                 beta = min(beta, value)
                 if alpha >= beta:
+                    self.record_cutoff(position, col, piece, depth, ply, col == valid_locations[0])
                     break
-            return best_col, value
 
+        if break_ties:
+            best_col = random.choice(tied_cols)
+        self.store_result(key, depth, alpha_original, beta_original, best_col, value)
+        return best_col, value
+
+    def book_move(self, position):
+        """
+        Opening book entry of a position with the AI to move
+        Returns: (column, score for the AI), None without a book or if the position is not in it
+        """
+        if self.opening_book is None:
+            return None
+        return self.opening_book.lookup(position, self.AI_PIECE)
+
+    def cached_search(self, position, budget):
+        """
+        Result of an earlier search of a position with the AI to move and the same budget, from this run or
+        an earlier one
+        Returns: (column, score for the AI), None without a position cache or if the search is not in it
+        """
+        if self.position_cache is None:
+            return None
+        return self.position_cache.get(position, self.AI_PIECE, budget)
+
+    def cache_search(self, position, budget, result):
+        """Store the (column, score) result of a search in the position cache, if there is one, and return it"""
+        if self.position_cache is not None and result[0] is not None:
+            self.position_cache.put(position, self.AI_PIECE, budget, result[0], result[1])
+        return result
+
+    def is_endgame(self, position):
+        """Whether few enough cells are left for the endgame solver to take over"""
+        return self.num_rows * self.num_columns - position.num_moves <= self.endgame_threshold
+
+    @records_search_stats("endgame")
+    def solve_endgame(self, board, piece=None):
+        '''
+        Exact move choice for a position close to the end of the game
+        :param board: current game board
+        :param piece: side to move, the AI by default
+        :return: (column, score) with score on the minimax scale from piece's point of view: 0 for a draw,
+            above WIN_SCORE for a win (higher the sooner), below -WIN_SCORE for a loss
+        '''
+        position = self.to_position(board)
+        piece = self.AI_PIECE if piece is None else piece
+        opponent_piece = self.PLAYER_PIECE if piece == self.AI_PIECE else self.AI_PIECE
+        moves = [col for col in CENTER_OUT_ORDER if position.can_play(col)]
+        if not moves:
+            return None, 0
+        limit = 1 if self.endgame_mode == "weak" else math.inf
+        # solved positions are searched to the end of the game
+        self.search_stats.depth = self.num_rows * self.num_columns - position.num_moves
+
+        best_col, best_value = moves[0], -math.inf
+        for col in moves:
+            position.play(col, piece)
+            if position.last_move_wins():
+                value = self.num_rows * self.num_columns + 1 - position.num_moves
+            else:
+                value = -self._solve(position, -limit, -max(best_value, -limit), opponent_piece)
+            position.undo()
+            if value > best_value:
+                best_col, best_value = col, value
+        return best_col, self.endgame_score(best_value)
+
+    def solved_score(self, position, piece):
+        """Exact score of a position for the side to move, on the minimax scale"""
+        if isinstance(position, ScoredBitboard):
+            # the solver never scores a leaf, a plain copy saves it the window updates of every move
+            position = Bitboard.copy(position)
+        limit = 1 if self.endgame_mode == "weak" else math.inf
+        return self.endgame_score(self._solve(position, -limit, limit, piece))
+
+    def endgame_score(self, value):
+        """Turn a solver score (moves to spare when winning, 0 for a draw) into the minimax scale"""
+        if value > 0:
+            return WIN_SCORE + value
+        if value < 0:
+            return -WIN_SCORE + value
+        return 0
+
+    def _solve(self, position, alpha, beta, piece):
+        '''
+        Negamax solver for the side to move. A win scores the number of cells left empty after the
+        winning disc plus one, so faster wins score higher, a draw scores 0 and a loss the negative.
+        Results are cached in endgame_cache as bounds, so a score outside (alpha, beta) is only a bound.
+        '''
+        self.nodes += 1
+        if self.nodes % CLOCK_CHECK_INTERVAL == 0:
+            self.check_clock()
+
+        if position.num_moves > self.deepest_moves:
+            self.deepest_moves = position.num_moves
+        if position.is_full():
+            self.early_terminations += 1
+            return 0
+        # pieces are always 1 and 2, so the key does not depend on which one the AI plays
+        key = position.hash ^ ZOBRIST_SIDE if piece == 2 else position.hash
+        cached = self.endgame_cache.get(key)
+        if cached is not None:
+            _, lower, upper = cached
+            if lower >= beta or lower == upper:
+                return lower
+            if upper <= alpha:
+                return upper
+            alpha, beta = max(alpha, lower), min(beta, upper)
+        alpha_original, beta_original = alpha, beta
+
+        opponent_piece = 3 - piece
+        moves = [col for col in CENTER_OUT_ORDER if position.heights[col] < self.num_rows]
+        # a move that wins straight away is always the best one
+        for col in moves:
+            position.play(col, piece)
+            won = position.last_move_wins()
+            position.undo()
+            if won:
+                value = self.num_rows * self.num_columns - position.num_moves
+                self.early_terminations += 1
+                self.endgame_cache.put((key, value, value))
+                return value
+
+        value = -math.inf
+        for col in moves:
+            position.play(col, piece)
+            score = -self._solve(position, -beta, -alpha, opponent_piece)
+            position.undo()
+            value = max(value, score)
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.cutoffs += 1
+                if col == moves[0]:
+                    self.first_move_cutoffs += 1
+                break
+
+        if value <= alpha_original:
+            self.endgame_cache.put((key, cached[1] if cached else -math.inf, value))
+        elif value >= beta_original:
+            self.endgame_cache.put((key, value, cached[2] if cached else math.inf))
+        else:
+            self.endgame_cache.put((key, value, value))
+        return value
+
+    def order_moves(self, position, tt_move, ply, piece):
+        """
+        Order the legal moves of a node so alpha-beta finds cutoffs early: the transposition table's
+        best move first, then this ply's killer moves, then by history score, ties kept center-out
+        """
+        history = self.history[piece]
+        heights = position.heights
+        moves = [col for col in CENTER_OUT_ORDER if heights[col] < self.num_rows]
+        moves.sort(key=lambda col: -history[col * HEIGHT + heights[col]])
+        for col in reversed(self.killers[ply]):
+            if col in moves:
+                moves.remove(col)
+                moves.insert(0, col)
+        if tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
+    def record_cutoff(self, position, col, piece, depth, ply, first_move):
+        """
+        Remember a move that caused a beta cutoff as a killer for its ply and in the history table
+        Args:
+            first_move: whether it was the first move tried at its node, counted for the search stats
+        """
+        self.cutoffs += 1
+        if first_move:
+            self.first_move_cutoffs += 1
+        killers = self.killers[ply]
+        if col != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = col
+        self.history[piece][col * HEIGHT + position.heights[col]] += depth * depth
+
+    def store_result(self, key, depth, alpha, beta, move, value):
+        """
+        Save a minimax result in the transposition table, with alpha and beta being the window the node was
+        searched with: a score outside that window is only a bound on the real one
+        """
+        if value <= alpha:
+            bound = UPPER_BOUND
+        elif value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.transposition_table.store(key, depth, bound, value, move)
+
+    @records_search_stats("mcts")
     def monte_carlo_tree_search(self, board, simulations=500):
         '''
-        MCTS for AI decision-making in hard mode, simulating 'simulations' number of random games
-        for each valid move. The move with the highest win count for AI is chosen.
-        - reduce default simulation count for better performance
-        - add early termination for clearly winning/losing positions
-        - add weighting to favor center positions
+        UCT Monte Carlo Tree Search for AI decision-making in hard mode. Every iteration walks down the tree
+        by UCB1, adds one node, plays a random game from it and counts the result on the way back up.
+        The tree under the moves actually played is kept for the next call in the same game.
+        - immediate winning and blocking moves are played without searching
+        - near the end of the game the endgame solver answers instead
         :param board: current game board
-        :param simulations: number of random games to simulate per move
-        :return: the best column to play based on MCTS simulation results
+        :param simulations: playouts per valid move, the search plays simulations * len(valid moves) random games
+            in total, playout_batch_size of them per iteration
+        :return: the most visited column at the root
         '''
-        valid_moves = self.get_valid_locations(board)
+        position = self.to_position(board)
+        valid_moves = position.valid_moves()
         if not valid_moves:
             return -1  # No valid moves
 
         # Quick check for immediate winning move
         for col in valid_moves:
-            row = next(r for r in range(6) if board[r][col] == 0)
-            temp_board = copy.deepcopy(board)
-            self.drop_piece(temp_board, row, col, self.AI_PIECE)
-            if self.check_win(temp_board, self.AI_PIECE, self.num_columns, self.num_rows):
+            position.play(col, self.AI_PIECE)
+            won = position.last_move_wins()
+            position.undo()
+            if won:
                 # Return winning move immediately
                 return col
 
         # Quick check for immediate blocking move
         for col in valid_moves:
-            row = next(r for r in range(6) if board[r][col] == 0)
-            temp_board = copy.deepcopy(board)
-            self.drop_piece(temp_board, row, col, self.PLAYER_PIECE)
-            if self.check_win(temp_board, self.PLAYER_PIECE, self.num_columns, self.num_rows):
+            position.play(col, self.PLAYER_PIECE)
+            won = position.last_move_wins()
+            position.undo()
+            if won:
                 # Block opponent's winning move
                 return col
 
-        # Center column preference weight
-        center_weight = 2 if 3 in valid_moves else 1
-        move_scores = {col: 0 for col in valid_moves}
-        move_simulations = {col: 0 for col in valid_moves}
+        # Close to the end of the game the exact answer is cheaper than the playouts
+        if self.is_endgame(position):
+            return self.solve_endgame(position)[0]
 
-        # Give initial bias to center columns
-        if 3 in move_scores:
-            # Small bias for center column
-            move_scores[3] += 0.5
+        book_entry = self.book_move(position)
+        if book_entry is not None:
+            return book_entry[0]
 
-        # Track best move
-        best_score = -1
-        early_stop_threshold = simulations // 4  # 25% of total simulations
+        # MCTS only caches its move, with a score of 0
+        budget = f"mcts:{simulations}:{self.playout_batch_size}:{self.mcts_workers}:{self.mcts_parallel_mode}"
+        cached = self.cached_search(position, budget)
+        if cached is not None:
+            return cached[0]
 
-        # run simulations for each valid move
-        for col in valid_moves:
-            wins = 0
-            for _ in range(simulations):
-                sim_board = copy.deepcopy(board)
-                row = next(r for r in range(6) if sim_board[r][col] == 0)
-                self.drop_piece(sim_board, row, col, self.AI_PIECE)
-                # simulate a random game from this position
-                if self.simulate_random_game(sim_board):
-                    wins += 1
-
-                move_simulations[col] = _ + 1
-                current_win_rate = wins / (_ + 1)
-
-                # Apply center column preference
-                if col == 3:
-                    move_scores[col] = current_win_rate * center_weight
-                else:
-                    move_scores[col] = current_win_rate
-
-                # Early termination checks
-                if _ > early_stop_threshold:
-                    if current_win_rate > best_score:
-                        best_score = current_win_rate
-                    # If we're significantly behind the best move, stop simulating this move
-                    elif current_win_rate < best_score - 0.3:
-                        break
+        if self.mcts_workers > 1:
+            col = self.get_parallel_mcts().search(self, position, simulations * len(valid_moves))
+            return self.cache_search(position, budget, (col, 0))[0]
 
-        # For moves that didn't complete all simulations, adjust scores
-        for col in valid_moves:
-            if move_simulations[col] < simulations:
-                # Penalize slightly for incomplete simulation (uncertainty)
-                confidence_factor = move_simulations[col] / simulations
-                move_scores[col] *= confidence_factor
+        root = self.reuse_tree(position)
+        self.grow_tree(root, position, simulations * len(valid_moves))
 
-        # Return the column with the highest score
-        return max(move_scores, key=move_scores.get)
+        self.mcts_root = root
+        self.mcts_root_moves = position.history[:]
+        return self.cache_search(position, budget, (root.most_visited_child().move, 0))[0]
+
+    def get_parallel_mcts(self):
+        """ParallelMCTS for the current worker settings, the worker processes are shared by every AIAlgorithm"""
+        parallel_mcts = self.parallel_mcts
+        if parallel_mcts is None or parallel_mcts.num_workers != self.mcts_workers \
+                or parallel_mcts.mode != self.mcts_parallel_mode:
+            self.parallel_mcts = ParallelMCTS(type(self), self.mcts_workers, self.mcts_parallel_mode)
+        return self.parallel_mcts
+
+    def reuse_tree(self, position, piece_to_move=None):
+        """
+        Find the node of the last search's tree for this position by following the moves played since,
+        or start a new tree if the position does not continue that game
+        Args:
+            piece_to_move: side to move in position, the AI by default
+        """
+        root = self.mcts_root
+        moves_before = len(self.mcts_root_moves)
+        if root is None or position.history[:moves_before] != self.mcts_root_moves:
+            root = None
+        else:
+            for col, piece in position.history[moves_before:]:
+                root = root.children.get(col)
+                if root is None or root.piece != piece:
+                    root = None
+                    break
+        if root is None:
+            # the root is the position after the other side's move, usually the player's with the AI to move
+            last_piece = self.other_piece(self.AI_PIECE if piece_to_move is None else piece_to_move)
+            return MCTSNode(None, None, last_piece, position.valid_moves())
+        root.parent = None
+        return root
+
+    def ponder(self, board, algorithm="minimax", max_playouts=PONDER_PLAYOUTS):
+        '''
+        Search on the opponent's time: with the player to move, search the player's likely replies until
+        cancel_search is called, so the AI's next search starts from the results
+        - "minimax": iterative deepening from the player's side, leaving the positions after each reply,
+          with the AI to move, in the transposition table
+        - "mcts": grows the UCT tree from the position, the subtree under the reply actually played becomes
+          the root of the next monte_carlo_tree_search
+        :param board: position with the player to move, searched in place and restored when the pondering stops
+        :param algorithm: "minimax" (also used by pvs searches) or "mcts", the AI's search for its next move
+        :param max_playouts: most random games MCTS plays before pondering stops on its own
+        '''
+        position = self.to_position(board)
+        start_moves = position.num_moves
+        if self.is_terminal(position):
+            return
+        try:
+            if algorithm == "mcts":
+                root = self.reuse_tree(position, self.PLAYER_PIECE)
+                # kept before growing so the tree survives the cancellation
+                self.mcts_root = root
+                self.mcts_root_moves = position.history[:]
+                self.grow_tree(root, position, max_playouts)
+            elif self.is_endgame(position):
+                self.solved_score(position, self.PLAYER_PIECE)
+            else:
+                self.transposition_table.new_search()
+                scored_position = self.to_scored_position(position)
+                for depth in range(1, self.num_rows * self.num_columns - start_moves + 1):
+                    self._minimax(scored_position, depth, -math.inf, math.inf, False)
+        except SearchCancelled:
+            # the tree search and the solver stop in the middle of their moves on position,
+            # minimax only played on its scored copy
+            position.undo_to(start_moves)
+
+    def grow_tree(self, root, position, num_playouts):
+        """Run MCTS iterations from root, the tree node of position, until num_playouts random games are played"""
+        for _ in range(-(-num_playouts // self.playout_batch_size)):
+            if self.cancel_requested:
+                raise SearchCancelled()
+            self.run_mcts_iteration(root, position)
+
+    def run_mcts_iteration(self, root, position):
+        '''
+        One selection, expansion, simulation and backpropagation pass, position is restored afterwards
+        :param root: tree node of position
+        '''
+        start_moves = position.num_moves
+        node = self.select_and_expand(root, position)
+        counts = self.simulate_leaf(node, position)
+        position.undo_to(start_moves)
+        self.backpropagate(node, counts)
+
+    def select_and_expand(self, root, position, virtual_loss=0):
+        '''
+        Selection and expansion steps of MCTS: walks down from root by UCB1 and adds one untried move.
+        Moves are played on position, which is left at the returned node.
+        :param virtual_loss: games counted as lost on the path, so parallel workers spread over the tree;
+            the caller takes them back with backpropagate
+        :return: the new node, or the terminal node reached
+        '''
+        node = root
+        node.visits += virtual_loss
+
+        # selection: follow the best UCB1 child while the node is fully expanded
+        while not node.untried_moves and not node.is_terminal:
+            node = node.select_child(MCTS_EXPLORATION)
+            node.visits += virtual_loss
+            position.play(node.move, node.piece)
+
+        # expansion: add one untried move
+        if not node.is_terminal:
+            col = node.untried_moves.pop(random.randrange(len(node.untried_moves)))
+            piece = self.other_piece(node.piece)
+            position.play(col, piece)
+            if position.last_move_wins():
+                node = node.add_child(col, piece, [], winner=piece)
+            elif position.is_full():
+                node = node.add_child(col, piece, [], winner=0)
+            else:
+                node = node.add_child(col, piece, position.valid_moves())
+            node.visits += virtual_loss
+        self.nodes += 1
+        if position.num_moves > self.deepest_moves:
+            self.deepest_moves = position.num_moves
+        return node
+
+    def simulate_leaf(self, node, position):
+        '''
+        Simulation step of MCTS: playout_batch_size random games from the position of a new node,
+        run together by batched_playouts when there is more than one
+        :return: dict from winning piece (0 for a draw) to the number of games it won
+        '''
+        if node.is_terminal:
+            self.early_terminations += 1
+            return {node.winner: self.playout_batch_size}
+        self.playouts += self.playout_batch_size
+        if self.playout_batch_size == 1:
+            return {self.random_playout(position, self.other_piece(node.piece)): 1}
+        ai_wins, draws, ai_losses = self.batched_playouts([position], self.playout_batch_size,
+                                                          self.other_piece(node.piece))[0]
+        return {self.AI_PIECE: int(ai_wins), 0: int(draws), self.PLAYER_PIECE: int(ai_losses)}
+
+    def backpropagate(self, node, counts, virtual_loss=0):
+        """Backpropagation step of MCTS: count the games of a simulation on every node up to the root"""
+        while node is not None:
+            node.visits -= virtual_loss
+            node.update_counts(counts)
+            node = node.parent
+
+    def other_piece(self, piece):
+        return self.PLAYER_PIECE if piece == self.AI_PIECE else self.AI_PIECE
 
     def simulate_random_game(self, board):
         '''
         Simulates a complete game from a given board state using random moves.
         - Players take turns making random valid moves.
         - The game continues until a winner is found or no moves are left.
-        :param board:
+        :param board: NumPy board or Bitboard, a Bitboard is restored to its starting state afterwards
         :return: True if AI wins, False otherwise
         '''
         # start with the opponent's turn
-        current_piece = self.PLAYER_PIECE
+        return self.random_playout(self.to_position(board), self.PLAYER_PIECE) == self.AI_PIECE
+
+    def random_playout(self, position, piece):
+        '''
+        Plays random valid moves, piece moving first, until someone wins or the board is full.
+        The position is restored to its starting state afterwards.
+        :return: the winning piece, 0 for a draw
+        '''
+        start_moves = position.num_moves
+        current_piece = piece
         while True:
-            valid_moves = self.get_valid_locations(board)
+            valid_moves = position.valid_moves()
             if not valid_moves:
-                return False
+                position.undo_to(start_moves)
+                return 0
 
             # select a random valid move
-            col = random.choice(valid_moves)
-            row = next(r for r in range(6) if board[r][col] == 0)
-            self.drop_piece(board, row, col, current_piece)
+            position.play(random.choice(valid_moves), current_piece)
 
             # check if the current move results in a win
-            if self.check_win(board, current_piece, self.num_columns, self.num_rows):
-                # return True if AI wins
-                return current_piece == self.AI_PIECE
+            if position.last_move_wins():
+                position.undo_to(start_moves)
+                return current_piece
 
             # switch turns between AI and player
             current_piece = self.PLAYER_PIECE if current_piece == self.AI_PIECE else self.AI_PIECE
 
+    def batched_playouts(self, boards, num_playouts=1000, piece=None, rng=None):
+        '''
+        Plays num_playouts random games from each starting board at once, advancing all of them together as
+        stacked NumPy arrays: every step samples one legal column per game and checks the windows through
+        the new disc of every game in a single gather.
+        :param boards: list of NumPy boards or Bitboards, all with the same side to move
+        :param num_playouts: random games to play from each board
+        :param piece: side to move first, the player by default like simulate_random_game
+        :param rng: numpy Generator, by default one seeded from the random module so random.seed applies
+        :return: int array of shape (len(boards), 3) with the AI's wins, draws and losses from each board
+        '''
+        if rng is None:
+            rng = np.random.default_rng(random.getrandbits(64))
+        piece = self.PLAYER_PIECE if piece is None else piece
+        num_cells = self.num_rows * self.num_columns
+
+        # one row per game: the 42 cells plus the always-empty padding cell, and the column heights
+        start_cells = np.zeros((len(boards), num_cells + 1), dtype=np.int8)
+        start_heights = np.zeros((len(boards), self.num_columns), dtype=np.intp)
+        for i, board in enumerate(boards):
+            position = self.to_position(board)
+            start_cells[i, :num_cells] = position.to_array().reshape(-1)
+            start_heights[i] = position.heights
+        cells = np.repeat(start_cells, num_playouts, axis=0)
+        heights = np.repeat(start_heights, num_playouts, axis=0)
+        num_games = len(cells)
+
+        # winner of every game, -1 while it is still running
+        winners = np.full(num_games, -1, dtype=np.int8)
+        active = np.arange(num_games)
+        current_piece = piece
+        while active.size:
+            active_heights = heights[active]
+            legal = active_heights < self.num_rows
+            # games without a legal move are full boards: draws
+            full = ~legal.any(axis=1)
+            if full.any():
+                winners[active[full]] = 0
+                active, active_heights, legal = active[~full], active_heights[~full], legal[~full]
+                if not active.size:
+                    break
+
+            # random legal column per game: the largest random number among its legal columns
+            cols = np.where(legal, rng.random(legal.shape), -1.0).argmax(axis=1)
+            played = active_heights[np.arange(active.size), cols] * self.num_columns + cols
+            cells[active, played] = current_piece
+            heights[active, cols] += 1
+
+            window_values = cells[active[:, None, None], CELL_WINDOW_CELLS[played]]
+            won = (window_values == current_piece).all(axis=2).any(axis=1)
+            winners[active[won]] = current_piece
+            active = active[~won]
+            current_piece = self.other_piece(current_piece)
+
+        winners = winners.reshape(len(boards), num_playouts)
+        return np.stack([(winners == self.AI_PIECE).sum(axis=1),
+                         (winners == 0).sum(axis=1),
+                         (winners == self.PLAYER_PIECE).sum(axis=1)], axis=1)
+
     def check_win(self, board, piece, num_columns, num_rows):
-        # check horizontal locations for win
-        for column in range(num_columns - 3):
-            for row in range(num_rows):
-                if (board[row][column] == piece and board[row][column + 1] == piece
-                        and board[row][column + 2] == piece and board[row][column + 3] == piece):
-                    if self.game_over:
-                        self.winning_pieces.append([row, column])
-                        self.winning_pieces.append([row, column + 1])
-                        self.winning_pieces.append([row, column + 2])
-                        self.winning_pieces.append([row, column + 3])
-                    return True
-
-        # check vertical locations for win
-        for column in range(num_columns):
-            for row in range(num_rows - 3):
-                if (board[row][column] == piece and board[row + 1][column] == piece
-                        and board[row + 2][column] == piece and board[row + 3][column] == piece):
-                    if self.game_over:
-                        self.winning_pieces.append([row, column])
-                        self.winning_pieces.append([row + 1, column])
-                        self.winning_pieces.append([row + 2, column])
-                        self.winning_pieces.append([row + 3, column])
-                    return True
-
-        # check positively sloped diagonals
-        for column in range(num_columns - 3):
-            for row in range(num_rows - 3):
-                if (board[row][column] == piece and board[row + 1][column + 1] == piece
-                        and board[row + 2][column + 2] == piece and board[row + 3][column + 3] == piece):
-                    if self.game_over:
-                        self.winning_pieces.append([row, column])
-                        self.winning_pieces.append([row + 1, column + 1])
-                        self.winning_pieces.append([row + 2, column + 2])
-                        self.winning_pieces.append([row + 3, column + 3])
-                    return True
-
-        # check negatively sloped diagonals
-        for column in range(num_columns - 3):
-            for row in range(3, num_rows):
-                if (board[row][column] == piece and board[row - 1][column + 1] == piece
-                        and board[row - 2][column + 2] == piece and board[row - 3][column + 3] == piece):
-                    if self.game_over:
-                        self.winning_pieces.append([row, column])
-                        self.winning_pieces.append([row - 1, column + 1])
-                        self.winning_pieces.append([row - 2, column + 2])
-                        self.winning_pieces.append([row - 3, column + 3])
-                    return True
-        return False
+        """
+        Whether the piece has four in a row. When game_over is set the winning cells are
+        added to winning_pieces as [row, column] pairs for the GUI to highlight.
+        """
+        if not isinstance(board, Bitboard):
+            # NumPy boards are checked with one gather of every window's cells
+            won = (np.asarray(board).reshape(-1)[BOARD_WINDOW_CELLS] == piece).all(axis=1)
+            if not won.any():
+                return False
+            if self.game_over:
+                self.winning_pieces.extend([list(cell) for cell in WINDOWS[int(won.argmax())]])
+            return True
+
+        position = board
+        if not position.has_won(piece):
+            return False
+        if self.game_over:
+            self.winning_pieces.extend(position.winning_cells(piece))
+        return True
 
     def random_move(self, board):
         """
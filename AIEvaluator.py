@@ -1,7 +1,51 @@
-import numpy as np
 import random
 import math
+import time
+import bisect
+import argparse
+import multiprocessing
+import numpy as np
 from tqdm import tqdm
+from Bitboard import Bitboard
+from TournamentLog import TournamentLog
+from PositionCache import open_cache
+from ParallelMCTS import shutdown_pools
+
+# normal quantile of the reported score intervals and of the "ci" stop rule (95% confidence)
+CONFIDENCE_Z = 1.96
+# the "ci" stop rule waits for this many games of a matchup before stopping it
+MIN_ADAPTIVE_GAMES = 10
+# the "sprt" stop rule tests a score of 0.5 - SPRT_DELTA against 0.5 + SPRT_DELTA for the first algorithm,
+# with SPRT_ALPHA and SPRT_BETA chances of deciding for the wrong one
+SPRT_DELTA = 0.1
+SPRT_ALPHA = 0.05
+SPRT_BETA = 0.05
+# upper bounds in milliseconds of the move latency histogram buckets, slower moves go in a last open bucket
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+# values of the search settings a game was played with before they were written to the log
+SETTING_DEFAULTS = {"minimax_depth": None, "mcts_workers": 1, "mcts_parallel_mode": "root",
+                    "opening_book": None, "position_cache": None}
+
+# evaluator of a tournament worker process, built by the pool initializer
+_worker_evaluator = None
+
+
+def _init_worker(ai_algorithm_class, time_budget_ms, minimax_depth, mcts_simulations, mcts_workers,
+                 mcts_parallel_mode, opening_book_path, position_cache_path):
+    global _worker_evaluator
+    _worker_evaluator = AIEvaluator(ai_algorithm_class)
+    _worker_evaluator.TIME_BUDGET_MS = time_budget_ms
+    _worker_evaluator.MINIMAX_DEPTH = minimax_depth
+    _worker_evaluator.MCTS_SIMULATIONS = mcts_simulations
+    _worker_evaluator.MCTS_WORKERS = mcts_workers
+    _worker_evaluator.MCTS_PARALLEL_MODE = mcts_parallel_mode
+    _worker_evaluator.OPENING_BOOK_PATH = opening_book_path
+    _worker_evaluator.POSITION_CACHE_PATH = position_cache_path
+
+
+def _play_scheduled_game(game):
+    """Play one scheduled tournament game in a worker process, returning its record"""
+    return _worker_evaluator.play_scheduled_game(*game)
 
 
 class AIEvaluator:
@@ -13,61 +57,99 @@ class AIEvaluator:
         self.AIAlgorithm = ai_algorithm_class
         self.num_rows = 6
         self.num_columns = 7
-        self.DEPTH = 3
+        # time minimax may think for each move
+        self.TIME_BUDGET_MS = 200
+        # fixed minimax and pvs search depth that replaces the time budget when set, so a game does the same work
+        # on any machine
+        self.MINIMAX_DEPTH = None
+        # MCTS playouts per valid move
+        self.MCTS_SIMULATIONS = 500
+        # processes every MCTS search runs on and their "root" or "tree" parallel mode; tournament games played
+        # on several workers must keep it at 1, a pool worker can't start processes of its own
+        self.MCTS_WORKERS = 1
+        self.MCTS_PARALLEL_MODE = "root"
+        # SQLite file of search results shared by the AIs of every game and run, None to search every move
+        self.POSITION_CACHE_PATH = None
+        # opening book both AIs play the early moves from, None to search them like every other move
+        self.OPENING_BOOK_PATH = None
         # track wins/losses/draws
         self.stats = {
             "random_vs_minimax": {"random_wins": 0, "minimax_wins": 0, "draws": 0, "total_games": 0},
             "random_vs_mcts": {"random_wins": 0, "mcts_wins": 0, "draws": 0, "total_games": 0},
             "minimax_vs_mcts": {"minimax_wins": 0, "mcts_wins": 0, "draws": 0, "total_games": 0}
         }
+        # move latency histogram and search work totals per algorithm
+        self.search_stats = {}
 
     def create_board(self):
         # Create an empty Connect Four board
         return np.zeros((self.num_rows, self.num_columns))
 
     def get_next_open_row(self, board, col):
-        # Find the next available row in the given column
+        # Find the next available row in the given column, on a Bitboard it is the column height
+        if isinstance(board, Bitboard):
+            return board.heights[col] if board.can_play(col) else -1
         for r in range(self.num_rows):
             if board[r][col] == 0:
                 return r
         return -1
 
     def drop_piece(self, board, row, col, piece):
-        # Place a piece on the board
-        board[row][col] = piece
+        # Place a piece on the board, a Bitboard can only take it on top of its column
+        if isinstance(board, Bitboard):
+            if row != board.heights[col]:
+                raise ValueError(f"row {row} of column {col} is not the next open row {board.heights[col]}")
+            board.play(col, piece)
+        else:
+            board[row][col] = piece
 
     def is_valid_location(self, board, col):
         # Check if a column has space for another piece
-        return col >= 0 and col < self.num_columns and board[self.num_rows - 1][col] == 0
+        if not 0 <= col < self.num_columns:
+            return False
+        if isinstance(board, Bitboard):
+            return board.can_play(col)
+        return board[self.num_rows - 1][col] == 0
 
     def get_algorithm_move(self, algorithm_type, board, ai_instance, piece=2):
         # Get the next move from the specified algorithm type
         if algorithm_type == "random":
             col = ai_instance.random_move(board)
-        elif algorithm_type == "minimax":
-            col, _ = ai_instance.minimax(board, self.DEPTH, -math.inf, math.inf, True)
+        elif algorithm_type in ("minimax", "pvs"):
+            if self.MINIMAX_DEPTH is not None:
+                col, _ = ai_instance.search(board, math.inf, max_depth=self.MINIMAX_DEPTH, algorithm=algorithm_type)
+            else:
+                col, _ = ai_instance.search(board, self.TIME_BUDGET_MS, algorithm=algorithm_type)
         elif algorithm_type == "mcts":
-            col = ai_instance.monte_carlo_tree_search(board)
+            col = ai_instance.monte_carlo_tree_search(board, self.MCTS_SIMULATIONS)
 
         return col
 
-    def play_game(self, algo1, algo2):
+    def play_game(self, algo1, algo2, game_record=None):
         """
         Simulate a full game between two AI algorithms
 
         Parameters:
-        - algo1: first algorithm ("random", "minimax", or "mcts")
-        - algo2: second algorithm ("random", "minimax", or "mcts")
+        - algo1: first algorithm ("random", "minimax", "pvs" or "mcts")
+        - algo2: second algorithm ("random", "minimax", "pvs" or "mcts")
+        - game_record: optional dict, every move is appended to its "moves" list, the time
+          taken to choose it, in milliseconds, to its "move_times_ms" list and the SearchStats
+          of the move as a dict (None for random moves) to its "search_stats" list
 
         Returns:
         - winner: 1 for algo1, 2 for algo2, 0 for draw
         """
-        # Create a new board
-        board = self.create_board()
+        # Create a new position, the AIs search a Bitboard directly without converting
+        board = Bitboard()
 
         # Initialize AI instances with proper piece assignments
-        ai1 = self.AIAlgorithm(1, 2)  # AI 1 uses piece 1
-        ai2 = self.AIAlgorithm(2, 1)  # AI 2 uses piece 2
+        ai1 = self.AIAlgorithm(1, 2, opening_book_path=self.OPENING_BOOK_PATH)  # AI 1 uses piece 1
+        ai2 = self.AIAlgorithm(2, 1, opening_book_path=self.OPENING_BOOK_PATH)  # AI 2 uses piece 2
+        if self.POSITION_CACHE_PATH:
+            ai1.position_cache = ai2.position_cache = open_cache(self.POSITION_CACHE_PATH)
+        for ai in (ai1, ai2):
+            ai.mcts_workers = self.MCTS_WORKERS
+            ai.mcts_parallel_mode = self.MCTS_PARALLEL_MODE
 
         # Game variables
         game_over = False
@@ -76,10 +158,14 @@ class AIEvaluator:
         # Play until game is over
         while not game_over:
             # Get column based on current algorithm's turn
+            move_start = time.perf_counter()
             if turn == 0:
                 col = self.get_algorithm_move(algo1, board, ai1, piece=1)
             else:
                 col = self.get_algorithm_move(algo2, board, ai2, piece=2)
+            move_time_ms = (time.perf_counter() - move_start) * 1000
+            algorithm, ai = (algo1, ai1) if turn == 0 else (algo2, ai2)
+            search_stats = ai.last_search_stats.to_dict() if algorithm != "random" else None
 
             # Make sure the move is valid
             if not self.is_valid_location(board, col):
@@ -96,9 +182,13 @@ class AIEvaluator:
             # Drop the piece
             piece = 1 if turn == 0 else 2
             self.drop_piece(board, row, col, piece)
+            if game_record is not None:
+                game_record["moves"].append(col)
+                game_record["move_times_ms"].append(round(move_time_ms, 3))
+                game_record["search_stats"].append(search_stats)
 
-            # Check for win
-            if self.check_win(board, piece):
+            # Check for win, only the lines through the piece just dropped can have changed
+            if board.last_move_wins():
                 game_over = True
                 return 1 if turn == 0 else 2
 
@@ -114,84 +204,265 @@ class AIEvaluator:
 
     def is_board_full(self, board):
         """Check if the board is full (no valid moves left)"""
+        if isinstance(board, Bitboard):
+            return board.is_full()
         return all(board[self.num_rows - 1][col] != 0 for col in range(self.num_columns))
 
     def check_win(self, board, piece):
         """Check if the current player has won"""
-        # Check horizontal
-        for c in range(self.num_columns - 3):
-            for r in range(self.num_rows):
-                if (board[r][c] == piece and board[r][c + 1] == piece and
-                        board[r][c + 2] == piece and board[r][c + 3] == piece):
-                    return True
-
-        # Check vertical
-        for c in range(self.num_columns):
-            for r in range(self.num_rows - 3):
-                if (board[r][c] == piece and board[r + 1][c] == piece and
-                        board[r + 2][c] == piece and board[r + 3][c] == piece):
-                    return True
-
-        # Check positively sloped diagonals
-        for c in range(self.num_columns - 3):
-            for r in range(self.num_rows - 3):
-                if (board[r][c] == piece and board[r + 1][c + 1] == piece and
-                        board[r + 2][c + 2] == piece and board[r + 3][c + 3] == piece):
-                    return True
-
-        # Check negatively sloped diagonals
-        for c in range(self.num_columns - 3):
-            for r in range(3, self.num_rows):
-                if (board[r][c] == piece and board[r - 1][c + 1] == piece and
-                        board[r - 2][c + 2] == piece and board[r - 3][c + 3] == piece):
-                    return True
-
-        return False
-
-    def run_competition(self, num_games=50):
+        if not isinstance(board, Bitboard):
+            board = Bitboard.from_array(board)
+        return board.has_won(piece)
+
+    def run_competition(self, num_games=50, matchups=None, workers=1, seed=None, chunk_size=None, log_path=None,
+                        stop_rule=None):
         """
         Run a competition between all algorithm pairs, focusing only on win rates
 
         Parameters:
         - num_games: number of games to play for each pairing
+        - matchups: list of (algo1, algo2) pairs, by default every pair of random, minimax and mcts;
+          e.g. [("minimax", "pvs")] to compare the two alpha-beta searches
+        - workers: number of processes to spread the games over
+        - seed: base seed, game i of matchup m is played after random.seed(seed + m * num_games + i) so
+          results do not depend on which worker plays it (timed minimax searches still depend on machine load,
+          unless MINIMAX_DEPTH fixes their depth)
+        - chunk_size: games handed to a worker at a time, by default about four chunks per worker and matchup
+        - log_path: JSON lines file every finished game is appended to; games already in it with the same search
+          settings are counted without being played again, so an interrupted run resumes where it stopped
+        - stop_rule: None to always play num_games per matchup, or "sprt" (sequential probability ratio test)
+          or "ci" (score confidence interval excluding 0.5) to stop a matchup as soon as it is decided,
+          num_games then being the most games it gets
 
         Returns:
         - Dictionary with win rate results
         """
-        matchups = [
-            ("random", "minimax"),
-            ("random", "mcts"),
-            ("minimax", "mcts")
-        ]
-
-        for algo1, algo2 in matchups:
+        if matchups is None:
+            matchups = [
+                ("random", "minimax"),
+                ("random", "mcts"),
+                ("minimax", "mcts")
+            ]
+        if workers > 1 and self.MCTS_WORKERS > 1:
+            raise ValueError("games on several workers can't run parallel MCTS, a pool worker process can't start "
+                             "MCTS worker processes of its own: use workers=1 or MCTS_WORKERS=1")
+        if seed is None and workers > 1:
+            # the workers' random states are copies of this one, give every game its own seed instead
+            seed = random.getrandbits(32)
+
+        # both change which moves get searched, so a run using them says so
+        if self.OPENING_BOOK_PATH:
+            print(f"Opening book: {self.OPENING_BOOK_PATH} (both AIs play book moves without searching)")
+        if self.POSITION_CACHE_PATH:
+            print(f"Position cache: {self.POSITION_CACHE_PATH} (cached positions are not searched again)")
+
+        log = TournamentLog(log_path) if log_path else None
+        finished = set()
+        if log is not None:
+            for game, game_record in self.read_log_games(log_path).items():
+                if game[:2] in matchups and game[2] < num_games:
+                    finished.add(game)
+                    self.record_result(game_record)
+            if finished:
+                print(f"Resuming from {log_path}: {len(finished)} games already played")
+
+        games = []
+        for m, (algo1, algo2) in enumerate(matchups):
             matchup_key = f"{algo1}_vs_{algo2}"
-            print(f"\nRunning competition: {algo1.title()} vs {algo2.title()} - {num_games} games")
-
-            # Play games with each algorithm going first half the time
-            for i in tqdm(range(num_games)):
-                # Alternate which algorithm goes first to ensure fairness
-                if i % 2 == 0:
-                    first, second = algo1, algo2
-                else:
-                    first, second = algo2, algo1
-
-                # Play the game
-                winner = self.play_game(first, second)
-
-                # Update statistics based on the winner
-                if winner == 0:
-                    # Draw
-                    self.stats[matchup_key]["draws"] += 1
-                elif (winner == 1 and i % 2 == 0) or (winner == 2 and i % 2 == 1):
-                    # First algorithm won
-                    self.stats[matchup_key][f"{algo1}_wins"] += 1
+            if matchup_key not in self.stats:
+                self.stats[matchup_key] = {f"{algo1}_wins": 0, f"{algo2}_wins": 0, "draws": 0, "total_games": 0}
+            games += [(algo1, algo2, i, None if seed is None else seed + m * num_games + i) for i in range(num_games)
+                      if (algo1, algo2, i) not in finished]
+
+        def finish(game_record):
+            if log is not None:
+                log.append(game_record)
+            self.record_result(game_record)
+
+        def decided(game):
+            return stop_rule is not None and self.is_decided(f"{game[0]}_vs_{game[1]}", stop_rule)
+
+        if workers <= 1:
+            for algo1, algo2 in matchups:
+                print(f"\nRunning competition: {algo1.title()} vs {algo2.title()} - {num_games} games")
+                for game in tqdm([game for game in games if game[:2] == (algo1, algo2)]):
+                    if decided(game):
+                        break
+                    finish(self.play_scheduled_game(*game))
+            return self.get_win_rates()
+
+        print(f"\nRunning competition: {', '.join(f'{a.title()} vs {b.title()}' for a, b in matchups)}"
+              f" - {num_games} games each on {workers} workers")
+        if chunk_size is None:
+            chunk_size = max(1, num_games // (workers * 4))
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=(self.AIAlgorithm, self.TIME_BUDGET_MS, self.MINIMAX_DEPTH,
+                                            self.MCTS_SIMULATIONS, self.MCTS_WORKERS, self.MCTS_PARALLEL_MODE,
+                                            self.OPENING_BOOK_PATH, self.POSITION_CACHE_PATH)) as pool:
+            progress = tqdm(total=len(games))
+            while games:
+                games = [game for game in games if not decided(game)]
+                if stop_rule is None:
+                    next_games = games
                 else:
-                    # Second algorithm won
-                    self.stats[matchup_key][f"{algo2}_wins"] += 1
+                    # play in rounds of one chunk per worker and matchup, checking the stop rule in between
+                    next_games = []
+                    for algo1, algo2 in matchups:
+                        next_games += [game for game in games if game[:2] == (algo1, algo2)][:workers * chunk_size]
+                games = [game for game in games if game not in next_games]
+                for game_record in pool.imap_unordered(_play_scheduled_game, next_games, chunk_size):
+                    finish(game_record)
+                    progress.update()
+            progress.close()
+
+        return self.get_win_rates()
+
+    def score_interval(self, matchup_key):
+        """
+        Wilson confidence interval of the first algorithm's score in a matchup, a win counting 1 and a draw 0.5
+
+        Returns:
+        - (low, high) bounds of the score, between 0 and 1
+        """
+        data = self.stats[matchup_key]
+        algo1 = matchup_key.split("_vs_")[0]
+        total_games = data["total_games"]
+        if total_games == 0:
+            return 0.0, 1.0
+        score = (data[f"{algo1}_wins"] + 0.5 * data["draws"]) / total_games
+        z_squared = CONFIDENCE_Z ** 2
+        denominator = 1 + z_squared / total_games
+        center = (score + z_squared / (2 * total_games)) / denominator
+        margin = CONFIDENCE_Z * math.sqrt(score * (1 - score) / total_games
+                                          + z_squared / (4 * total_games ** 2)) / denominator
+        return max(0.0, center - margin), min(1.0, center + margin)
+
+    def sprt_log_likelihood_ratio(self, matchup_key):
+        """
+        Log likelihood ratio of the first algorithm winning decisive games with probability 0.5 + SPRT_DELTA
+        rather than 0.5 - SPRT_DELTA; draws carry no information either way
+        """
+        data = self.stats[matchup_key]
+        algo1, algo2 = matchup_key.split("_vs_")
+        better, worse = 0.5 + SPRT_DELTA, 0.5 - SPRT_DELTA
+        return data[f"{algo1}_wins"] * math.log(better / worse) + data[f"{algo2}_wins"] * math.log(worse / better)
+
+    def is_decided(self, matchup_key, stop_rule):
+        """Whether a matchup's result is statistically settled under the "sprt" or "ci" stop rule"""
+        if stop_rule == "sprt":
+            log_likelihood_ratio = self.sprt_log_likelihood_ratio(matchup_key)
+            return (log_likelihood_ratio >= math.log((1 - SPRT_BETA) / SPRT_ALPHA)
+                    or log_likelihood_ratio <= math.log(SPRT_BETA / (1 - SPRT_ALPHA)))
+        if stop_rule == "ci":
+            if self.stats[matchup_key]["total_games"] < MIN_ADAPTIVE_GAMES:
+                return False
+            low, high = self.score_interval(matchup_key)
+            return low > 0.5 or high < 0.5
+        raise ValueError(f"unknown stop rule: {stop_rule}")
+
+    def play_scheduled_game(self, algo1, algo2, game_index, seed=None):
+        """
+        Play game number game_index of a matchup, algo1 going first in even games
+
+        Returns:
+        - record of the game: algorithms, game index, seed, search budgets, the moves with the time
+          each took and the result (1 for algo1, 2 for algo2, 0 for draw)
+        """
+        if seed is not None:
+            random.seed(seed)
+        # Alternate which algorithm goes first to ensure fairness
+        first, second = (algo1, algo2) if game_index % 2 == 0 else (algo2, algo1)
+        game_record = {
+            "algo1": algo1, "algo2": algo2, "game_index": game_index, "seed": seed, "first": first,
+            **self.get_settings(), "moves": [], "move_times_ms": [], "search_stats": []
+        }
+        winner = self.play_game(first, second, game_record)
+        if winner != 0 and game_index % 2 == 1:
+            winner = 3 - winner
+        game_record["result"] = winner
+        game_record["winner"] = {0: "draw", 1: algo1, 2: algo2}[winner]
+        return game_record
+
+    def get_settings(self):
+        """Search settings stored with every game record, games only count together when they all match"""
+        return {
+            "minimax_budget_ms": self.TIME_BUDGET_MS, "minimax_depth": self.MINIMAX_DEPTH,
+            "mcts_simulations": self.MCTS_SIMULATIONS, "mcts_workers": self.MCTS_WORKERS,
+            "mcts_parallel_mode": self.MCTS_PARALLEL_MODE,
+            "opening_book": self.OPENING_BOOK_PATH, "position_cache": self.POSITION_CACHE_PATH
+        }
 
-                self.stats[matchup_key]["total_games"] += 1
+    def read_log_games(self, log_path):
+        """
+        Games of a tournament log played with the current settings, the first record of every game only
 
+        Returns:
+        - Dictionary from (algo1, algo2, game_index) to the game record; games logged with other settings are
+          left out and counted in a printed warning
+        """
+        settings = self.get_settings()
+        games = {}
+        skipped = 0
+        for game_record in TournamentLog(log_path).read_games():
+            # settings added after a log was written are missing from its records and had their default values
+            if any(game_record.get(key, SETTING_DEFAULTS.get(key)) != value for key, value in settings.items()):
+                skipped += 1
+                continue
+            games.setdefault((game_record["algo1"], game_record["algo2"], game_record["game_index"]), game_record)
+        if skipped:
+            print(f"Ignoring {skipped} games in {log_path} played with other search settings")
+        return games
+
+    def record_result(self, game_record):
+        """Add the result of a game record from play_scheduled_game to the stats"""
+        algo1, algo2, winner = game_record["algo1"], game_record["algo2"], game_record["result"]
+        matchup_key = f"{algo1}_vs_{algo2}"
+        if matchup_key not in self.stats:
+            self.stats[matchup_key] = {f"{algo1}_wins": 0, f"{algo2}_wins": 0, "draws": 0, "total_games": 0}
+        # Update statistics based on the winner
+        if winner == 0:
+            # Draw
+            self.stats[matchup_key]["draws"] += 1
+        elif winner == 1:
+            # First algorithm won
+            self.stats[matchup_key][f"{algo1}_wins"] += 1
+        else:
+            # Second algorithm won
+            self.stats[matchup_key][f"{algo2}_wins"] += 1
+
+        self.stats[matchup_key]["total_games"] += 1
+        self.record_search_stats(game_record)
+
+    def record_search_stats(self, game_record):
+        """Add the move times and search stats of a game record to the per-algorithm latency stats"""
+        first = game_record["first"]
+        second = game_record["algo2"] if first == game_record["algo1"] else game_record["algo1"]
+        # logs written before search stats were recorded only have the move times
+        move_stats = game_record.get("search_stats") or [None] * len(game_record["move_times_ms"])
+        for i, (move_time_ms, search_stats) in enumerate(zip(game_record["move_times_ms"], move_stats)):
+            algorithm = first if i % 2 == 0 else second
+            if algorithm not in self.search_stats:
+                self.search_stats[algorithm] = {
+                    "moves": 0, "total_ms": 0.0, "max_ms": 0.0, "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                    "nodes": 0, "playouts": 0, "cutoffs": 0, "first_move_cutoffs": 0, "early_terminations": 0,
+                    "tt_probes": 0, "tt_hits": 0, "max_depth": 0, "timeouts": 0
+                }
+            data = self.search_stats[algorithm]
+            data["moves"] += 1
+            data["total_ms"] += move_time_ms
+            data["max_ms"] = max(data["max_ms"], move_time_ms)
+            data["histogram"][bisect.bisect_left(LATENCY_BUCKETS_MS, move_time_ms)] += 1
+            if search_stats is not None:
+                for key in ("nodes", "playouts", "cutoffs", "first_move_cutoffs", "early_terminations",
+                            "tt_probes", "tt_hits"):
+                    data[key] += search_stats[key]
+                data["max_depth"] = max(data["max_depth"], search_stats["max_depth"])
+                data["timeouts"] += search_stats["timed_out"]
+
+    def load_log(self, log_path):
+        """Rebuild the stats from the games of a tournament log played with the current settings, replaying none"""
+        for game_record in self.read_log_games(log_path).values():
+            self.record_result(game_record)
         return self.get_win_rates()
 
     def get_win_rates(self):
@@ -206,40 +477,160 @@ class AIEvaluator:
                 algo1_win_rate = (data[f"{algo1}_wins"] / total_games) * 100
                 algo2_win_rate = (data[f"{algo2}_wins"] / total_games) * 100
                 draw_rate = (data["draws"] / total_games) * 100
+                score_low, score_high = self.score_interval(matchup)
 
                 results[matchup] = {
                     f"{algo1}_win_rate": algo1_win_rate,
                     f"{algo2}_win_rate": algo2_win_rate,
-                    "draw_rate": draw_rate
+                    "draw_rate": draw_rate,
+                    # confidence bounds of algo1's score (wins plus half the draws), in percent
+                    f"{algo1}_score_ci": (score_low * 100, score_high * 100),
+                    "total_games": total_games
                 }
 
         return results
 
+    def get_latency_stats(self):
+        """
+        Move latency and search work per algorithm
+
+        Returns:
+        - Dictionary from algorithm to its number of moves, mean, 50th and 95th percentile (upper bounds of the
+          histogram buckets they fall in) and maximum move time in milliseconds, the latency histogram as a
+          list of (bucket upper bound, moves) with None for the open last bucket, and the mean nodes, playouts
+          and first-move cutoff rate of its searches
+        """
+        results = {}
+        for algorithm, data in self.search_stats.items():
+            moves = data["moves"]
+            bounds = LATENCY_BUCKETS_MS + [None]
+            results[algorithm] = {
+                "moves": moves,
+                "mean_ms": data["total_ms"] / moves,
+                "p50_ms": self.histogram_percentile(data["histogram"], 0.5, data["max_ms"]),
+                "p95_ms": self.histogram_percentile(data["histogram"], 0.95, data["max_ms"]),
+                "max_ms": data["max_ms"],
+                "histogram": list(zip(bounds, data["histogram"])),
+                "nodes_per_move": data["nodes"] / moves,
+                "playouts_per_move": data["playouts"] / moves,
+                "first_move_cutoff_rate": data["first_move_cutoffs"] / data["cutoffs"] if data["cutoffs"] else 0.0,
+                "tt_hit_rate": data["tt_hits"] / data["tt_probes"] if data["tt_probes"] else 0.0,
+                "early_terminations": data["early_terminations"],
+                "max_depth": data["max_depth"],
+                "timeouts": data["timeouts"]
+            }
+        return results
+
+    def histogram_percentile(self, histogram, fraction, max_ms):
+        """Upper bound of the latency bucket holding the given fraction of the moves, max_ms for the open bucket"""
+        needed = fraction * sum(histogram)
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, histogram):
+            seen += count
+            if seen >= needed:
+                return min(bound, max_ms)
+        return max_ms
+
+    def print_latency_stats(self):
+        """Print the move latency histogram and search work of every algorithm"""
+        print("\n=== MOVE LATENCY ===")
+        for algorithm, data in self.get_latency_stats().items():
+            print(f"\n{algorithm.title()}: {data['moves']} moves, mean {data['mean_ms']:.1f} ms, "
+                  f"p50 <= {data['p50_ms']:.0f} ms, p95 <= {data['p95_ms']:.0f} ms, max {data['max_ms']:.1f} ms")
+            if data["nodes_per_move"] or data["playouts_per_move"]:
+                print(f"  {data['nodes_per_move']:,.0f} nodes and {data['playouts_per_move']:,.0f} playouts per move, "
+                      f"first-move cutoff rate {data['first_move_cutoff_rate']:.1%}, "
+                      f"TT hit rate {data['tt_hit_rate']:.1%}, max depth {data['max_depth']}, "
+                      f"{data['timeouts']} timeouts")
+            largest = max(count for _, count in data["histogram"])
+            lower = 0
+            for bound, count in data["histogram"]:
+                label = f"{lower}-{bound} ms" if bound is not None else f"> {lower} ms"
+                lower = bound
+                if count:
+                    print(f"  {label:>14} | {count:<6} | {'#' * max(1, round(40 * count / largest))}")
+
     def print_win_rates(self):
         """Print the win rates in a table format"""
         results = self.get_win_rates()
 
         print("\n=== ALGORITHM WIN RATES ===\n")
-        print(f"{'Matchup':<20} | {'Algorithm 1 Win %':<20} | {'Algorithm 2 Win %':<20} | {'Draw %':<10}")
-        print("-" * 75)
+        print(f"{'Matchup':<20} | {'Algorithm 1 Win %':<20} | {'Algorithm 2 Win %':<20} | {'Draw %':<10} | "
+              f"{'Alg. 1 Score 95% CI':<20} | {'Games':<6}")
+        print("-" * 108)
 
         for matchup, data in results.items():
             algo1, algo2 = matchup.split("_vs_")
+            score_low, score_high = data[f"{algo1}_score_ci"]
             print(f"{algo1.title()} vs {algo2.title():<10} | "
                   f"{data[f'{algo1}_win_rate']:<20.2f} | "
                   f"{data[f'{algo2}_win_rate']:<20.2f} | "
-                  f"{data['draw_rate']:<10.2f}")
+                  f"{data['draw_rate']:<10.2f} | "
+                  f"{f'{score_low:.1f} - {score_high:.1f}':<20} | "
+                  f"{data['total_games']:<6}")
+
+
+def parse_matchup(text):
+    """Parse an algo1:algo2 command line matchup"""
+    algorithms = text.split(":")
+    valid = ("random", "minimax", "pvs", "mcts")
+    if len(algorithms) != 2 or any(algorithm not in valid for algorithm in algorithms):
+        raise argparse.ArgumentTypeError(f"matchups look like minimax:mcts, with algorithms from {', '.join(valid)}")
+    return tuple(algorithms)
 
 
-# Example usage
 if __name__ == "__main__":
     from AIAlgorithm import AIAlgorithm  # Import your AI algorithm class
 
+    parser = argparse.ArgumentParser(description="Play AI algorithms against each other and print their win rates")
+    parser.add_argument("num_games", nargs="?", type=int, default=50, help="games per matchup (default 50)")
+    parser.add_argument("--workers", type=int, default=1, help="processes to play games on (default 1)")
+    parser.add_argument("--matchups", nargs="+", type=parse_matchup, metavar="ALGO1:ALGO2",
+                        help="matchups to play, e.g. random:minimax minimax:pvs (default: random, minimax and mcts pairs)")
+    parser.add_argument("--seed", type=int, help="base random seed for reproducible games")
+    parser.add_argument("--chunk-size", type=int, help="games handed to a worker at a time")
+    parser.add_argument("--minimax-budget-ms", type=int, default=200, help="minimax and pvs time per move (default 200)")
+    parser.add_argument("--minimax-depth", type=int,
+                        help="fixed minimax and pvs search depth instead of the time per move")
+    parser.add_argument("--mcts-simulations", type=int, default=500, help="MCTS playouts per valid move (default 500)")
+    parser.add_argument("--mcts-workers", type=int, default=1,
+                        help="processes every MCTS search runs on, only with --workers 1 (default 1)")
+    parser.add_argument("--mcts-mode", choices=["root", "tree"], default="root",
+                        help="parallel MCTS mode with --mcts-workers above 1 (default root)")
+    parser.add_argument("--stop-rule", choices=["sprt", "ci"],
+                        help="stop each matchup once decided, num_games being the most it gets")
+    parser.add_argument("--log", help="JSON lines file to append finished games to and resume from")
+    parser.add_argument("--summary", action="store_true", help="only print the win rates of the games in --log")
+    parser.add_argument("--latency", action="store_true",
+                        help="also print move latency histograms and search stats per algorithm")
+    parser.add_argument("--cache", help="SQLite file keeping search results across runs, so repeated positions "
+                                        "are not searched again")
+    parser.add_argument("--opening-book", help="opening book file built by OpeningBook.py for both AIs to play from")
+    args = parser.parse_args()
+    if args.mcts_workers > 1 and args.workers > 1:
+        parser.error("--mcts-workers above 1 needs --workers 1, tournament workers can't start MCTS workers")
+
     # Create evaluator
     evaluator = AIEvaluator(AIAlgorithm)
-
-    # Run a competition with 50 games per matchup
-    results = evaluator.run_competition(num_games=50)
+    evaluator.TIME_BUDGET_MS = args.minimax_budget_ms
+    evaluator.MINIMAX_DEPTH = args.minimax_depth
+    evaluator.MCTS_SIMULATIONS = args.mcts_simulations
+    evaluator.MCTS_WORKERS = args.mcts_workers
+    evaluator.MCTS_PARALLEL_MODE = args.mcts_mode
+    evaluator.POSITION_CACHE_PATH = args.cache
+    evaluator.OPENING_BOOK_PATH = args.opening_book
+
+    if args.summary:
+        if not args.log:
+            parser.error("--summary needs --log")
+        evaluator.load_log(args.log)
+    else:
+        results = evaluator.run_competition(num_games=args.num_games, matchups=args.matchups, workers=args.workers,
+                                            seed=args.seed, chunk_size=args.chunk_size, log_path=args.log,
+                                            stop_rule=args.stop_rule)
+        shutdown_pools()
 
     # Print just the win rates
     evaluator.print_win_rates()
+    if args.latency:
+        evaluator.print_latency_stats()
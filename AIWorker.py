@@ -0,0 +1,72 @@
+import threading
+from AIAlgorithm import SearchCancelled
+
+
+class AIWorker:
+    """
+    Runs AI move searches on a background thread so the game loop keeps handling events and drawing frames
+    while the AI thinks. Only one search runs at a time, and the AIAlgorithm must not be used by the game
+    while a search is running.
+    """
+
+    def __init__(self, ai):
+        """
+        Args:
+            ai: the AIAlgorithm the searches run on, cancelled through its cancel_search
+        """
+        self.ai = ai
+        self.thread = None
+        self.move = None
+        self.error = None
+
+    def start(self, choose_move, position):
+        """
+        Start searching for a move, cancelling any search still running
+        Args:
+            choose_move: function taking a position and returning the chosen column
+            position: Bitboard to search, the search runs on a copy so the game can keep playing on it
+        """
+        self.cancel()
+        self.move = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(choose_move, position.copy()), daemon=True)
+        self.thread.start()
+
+    def run(self, choose_move, position):
+        try:
+            self.move = choose_move(position)
+        except SearchCancelled:
+            self.move = None
+        except Exception as error:
+            # handed over to the game loop by get_move
+            self.error = error
+
+    def is_busy(self):
+        """Whether a search is still running"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def is_done(self):
+        """Whether a search was started and has finished"""
+        return self.thread is not None and not self.thread.is_alive()
+
+    def get_move(self):
+        """
+        Returns: the column chosen by the finished search, None while it is running or if it was cancelled
+        """
+        if self.is_busy():
+            return None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        return self.move
+
+    def cancel(self):
+        """Stop the running search and wait for its thread to end, e.g. when the game is reset or closed"""
+        if self.thread is None:
+            return
+        if self.thread.is_alive():
+            self.ai.cancel_search()
+            self.thread.join()
+            self.ai.cancel_requested = False
+        self.thread = None
+        self.move = None
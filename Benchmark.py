@@ -0,0 +1,290 @@
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import numpy as np
+from Bitboard import Bitboard
+from AIEvaluator import AIEvaluator
+
+# fixed benchmark positions by game phase, each written as the columns played from the empty board
+# with piece 1 moving first; none of them is won and the side to move has no immediate win
+POSITIONS = {
+    "opening": ["", "3", "3323"],
+    "midgame": ["660002615656", "1153464335611516", "54120605126446102123"],
+    "endgame": ["26115415630132106321452544", "0546015300510506646633422652"],
+}
+# matchups timed end to end with AIEvaluator.play_game
+GAME_MATCHUPS = [("random", "mcts"), ("minimax", "mcts")]
+# a metric that got worse by more than this fraction of its baseline value is reported as a regression
+DEFAULT_TOLERANCE = 0.1
+
+
+def position_from_moves(moves):
+    """Bitboard reached by playing the columns of a move string, piece 1 moving first"""
+    position = Bitboard()
+    for i, col in enumerate(moves):
+        position.play(int(col), 1 + i % 2)
+    return position
+
+
+class Benchmark:
+    """
+    Speed benchmark of AIAlgorithm and AIEvaluator over the fixed POSITIONS corpus.
+    Every timing is the best of several repeats with the random generators reseeded, so two runs on the
+    same machine do the same work and differ only by timing noise.
+    """
+
+    def __init__(self, ai_algorithm_class, repeats=3, minimax_depth=5, playouts=500, evaluation_calls=2000,
+                 games=2, game_depth=3, mcts_simulations=20):
+        """
+        Args:
+            ai_algorithm_class: AIAlgorithm class to benchmark
+            repeats: times every measurement is repeated, the fastest one is kept
+            minimax_depth: fixed depth of the minimax searches
+            playouts: simulate_random_game calls per position
+            evaluation_calls: check_win and score_position calls per position
+            games: games per matchup of GAME_MATCHUPS
+            game_depth: fixed minimax depth of the timed games, a time budget would hide a slower search
+            mcts_simulations: MCTS playouts per valid move in the timed games
+        """
+        self.AIAlgorithm = ai_algorithm_class
+        self.repeats = repeats
+        self.minimax_depth = minimax_depth
+        self.playouts = playouts
+        self.evaluation_calls = evaluation_calls
+        self.games = games
+        self.game_depth = game_depth
+        self.mcts_simulations = mcts_simulations
+
+    def side_to_move(self, position):
+        """(piece to move, opponent) in a position"""
+        return (1, 2) if position.num_moves % 2 == 0 else (2, 1)
+
+    def best_time(self, run):
+        """
+        Fastest of self.repeats calls of run, with the random generators reseeded before each call
+        Returns: (seconds, result of the fastest call)
+        """
+        best = (math.inf, None)
+        for _ in range(self.repeats):
+            random.seed(0)
+            np.random.seed(0)
+            start = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - start
+            if elapsed < best[0]:
+                best = (elapsed, result)
+        return best
+
+    def bench_minimax(self):
+        """Nodes per second of a fixed-depth minimax search from an empty transposition table, by phase"""
+        results = {}
+        for phase, move_strings in POSITIONS.items():
+            total_nodes, total_seconds = 0, 0.0
+            for moves in move_strings:
+                position = position_from_moves(moves)
+
+                def run():
+                    # the endgame solver is turned off so every phase runs the same fixed-depth search
+                    ai = self.AIAlgorithm(*self.side_to_move(position), endgame_threshold=0)
+                    ai.minimax(position, self.minimax_depth, -math.inf, math.inf, True)
+                    return ai.nodes
+
+                seconds, nodes = self.best_time(run)
+                total_nodes += nodes
+                total_seconds += seconds
+            results[f"minimax.{phase}.nodes_per_sec"] = metric(total_nodes / total_seconds, "nodes/s")
+        return results
+
+    def bench_playouts(self):
+        """simulate_random_game calls per second, by phase"""
+        results = {}
+        for phase, move_strings in POSITIONS.items():
+            total_seconds = 0.0
+            for moves in move_strings:
+                position = position_from_moves(moves)
+                # simulate_random_game starts with the opponent of the AI, so the AI is the side that just moved
+                ai = self.AIAlgorithm(*reversed(self.side_to_move(position)))
+
+                def run():
+                    for _ in range(self.playouts):
+                        ai.simulate_random_game(position)
+
+                total_seconds += self.best_time(run)[0]
+            results[f"playouts.{phase}.playouts_per_sec"] = metric(
+                self.playouts * len(move_strings) / total_seconds, "playouts/s")
+        return results
+
+    def bench_evaluation(self):
+        """check_win and score_position calls per second on NumPy boards and on Bitboards, and batched boards per second"""
+        ai = self.AIAlgorithm(2, 1)
+        positions = [position_from_moves(moves) for move_strings in POSITIONS.values() for moves in move_strings]
+        boards = {"array": [position.to_array() for position in positions], "bitboard": positions}
+        calls = self.evaluation_calls * len(positions)
+        results = {}
+        for board_type, board_list in boards.items():
+            def run_check_win():
+                for board in board_list:
+                    for _ in range(self.evaluation_calls):
+                        ai.check_win(board, 1, 7, 6)
+
+            def run_score_position():
+                for board in board_list:
+                    for _ in range(self.evaluation_calls):
+                        ai.score_position(board, 2)
+
+            results[f"check_win.{board_type}.calls_per_sec"] = metric(
+                calls / self.best_time(run_check_win)[0], "calls/s")
+            results[f"score_position.{board_type}.calls_per_sec"] = metric(
+                calls / self.best_time(run_score_position)[0], "calls/s")
+
+        # the same number of boards scored and checked for a win by one evaluate_boards call
+        stacked_boards = np.repeat(np.array(boards["array"]), self.evaluation_calls, axis=0)
+        results["evaluate_boards.batch.boards_per_sec"] = metric(
+            calls / self.best_time(lambda: ai.evaluate_boards(stacked_boards))[0], "boards/s")
+        return results
+
+    def bench_games(self):
+        """Seconds and search nodes per AIEvaluator.play_game game, by matchup"""
+        evaluator = AIEvaluator(self.AIAlgorithm)
+        evaluator.MINIMAX_DEPTH = self.game_depth
+        evaluator.MCTS_SIMULATIONS = self.mcts_simulations
+        results = {}
+        for algo1, algo2 in GAME_MATCHUPS:
+            def run():
+                nodes = 0
+                for _ in range(self.games):
+                    game_record = {"moves": [], "move_times_ms": [], "search_stats": []}
+                    evaluator.play_game(algo1, algo2, game_record)
+                    nodes += sum(stats["nodes"] for stats in game_record["search_stats"] if stats is not None)
+                return nodes
+
+            seconds, nodes = self.best_time(run)
+            results[f"play_game.{algo1}_vs_{algo2}.seconds_per_game"] = metric(
+                seconds / self.games, "s", higher_is_better=False)
+            # the same for every run of the same code, a change means the games searched differently
+            results[f"play_game.{algo1}_vs_{algo2}.nodes_per_game"] = metric(
+                nodes / self.games, "nodes", higher_is_better=False)
+        return results
+
+    def run(self, groups=None):
+        """
+        Run the benchmark
+        Args:
+            groups: names of the benchmark groups to run ("minimax", "playouts", "evaluation", "games"),
+                all of them by default
+        Returns: JSON-serializable dict with the run settings and machine under "meta" and the metrics
+            under "results"
+        """
+        benches = {
+            "minimax": self.bench_minimax,
+            "playouts": self.bench_playouts,
+            "evaluation": self.bench_evaluation,
+            "games": self.bench_games,
+        }
+        results = {}
+        for group in groups or benches:
+            results.update(benches[group]())
+        return {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.platform(),
+                "settings": {
+                    "repeats": self.repeats,
+                    "minimax_depth": self.minimax_depth,
+                    "playouts": self.playouts,
+                    "evaluation_calls": self.evaluation_calls,
+                    "games": self.games,
+                    "game_depth": self.game_depth,
+                    "mcts_simulations": self.mcts_simulations,
+                },
+            },
+            "results": results,
+        }
+
+
+def metric(value, unit, higher_is_better=True):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare the metrics of a benchmark report with a baseline report
+    Args:
+        report: dict returned by Benchmark.run
+        baseline: earlier report to compare against
+        tolerance: fraction a metric may get worse by before it counts as a regression
+    Returns: list of dicts with name, baseline, current, change (fraction, positive is better) and
+        regression, for the metrics found in both reports
+    """
+    rows = []
+    for name, current in report["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old_value = baseline["results"][name]["value"]
+        change = (current["value"] - old_value) / old_value
+        if not current["higher_is_better"]:
+            change = -change
+        rows.append({
+            "name": name,
+            "baseline": old_value,
+            "current": current["value"],
+            "change": change,
+            "regression": change < -tolerance,
+        })
+    return rows
+
+
+def print_report(report, comparison=None):
+    """Print the metrics of a report, with the change against a baseline when a comparison is given"""
+    changes = {row["name"]: row for row in comparison or []}
+    print(f"{'Metric':<44} | {'Value':>14} | {'Unit':<10} | Change")
+    print("-" * 85)
+    for name, result in report["results"].items():
+        change = ""
+        if name in changes:
+            change = f"{changes[name]['change']:+.1%}"
+            if changes[name]["regression"]:
+                change += "  REGRESSION"
+        value = f"{result['value']:,.0f}" if result["value"] >= 100 else f"{result['value']:.4f}"
+        print(f"{name:<44} | {value:>14} | {result['unit']:<10} | {change}")
+
+
+if __name__ == "__main__":
+    from AIAlgorithm import AIAlgorithm
+
+    parser = argparse.ArgumentParser(description="Benchmark the speed of the AI algorithms on a fixed position corpus")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"slowdown fraction reported as a regression (default {DEFAULT_TOLERANCE})")
+    parser.add_argument("--groups", nargs="+", choices=["minimax", "playouts", "evaluation", "games"],
+                        help="benchmark groups to run (default all)")
+    parser.add_argument("--repeats", type=int, default=3, help="repeats of every measurement, the best is kept")
+    parser.add_argument("--minimax-depth", type=int, default=5, help="fixed minimax search depth (default 5)")
+    parser.add_argument("--game-depth", type=int, default=3, help="fixed minimax depth of the timed games (default 3)")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(AIAlgorithm, repeats=args.repeats, minimax_depth=args.minimax_depth,
+                          game_depth=args.game_depth)
+    report = benchmark.run(args.groups)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            comparison = compare(report, json.load(baseline_file), args.tolerance)
+        report["comparison"] = comparison
+    print_report(report, comparison)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    # a non-zero exit status lets scripts fail on a regression
+    if comparison and any(row["regression"] for row in comparison):
+        sys.exit(1)
@@ -0,0 +1,238 @@
+import random
+import numpy as np
+
+NUM_ROWS = 6
+NUM_COLUMNS = 7
+# every column gets one extra sentinel bit on top so shifted masks never wrap into the next column
+HEIGHT = NUM_ROWS + 1
+# shifts for vertical, horizontal, descending diagonal and ascending diagonal lines
+DIRECTIONS = (1, HEIGHT, HEIGHT - 1, HEIGHT + 1)
+
+
+# Zobrist keys, one random 64-bit number per piece and cell, from a fixed seed so hashes are
+# the same in every process
+_zobrist_random = random.Random(5100)
+ZOBRIST_KEYS = [[_zobrist_random.getrandbits(64) for _ in range(NUM_COLUMNS * HEIGHT)] for _ in range(3)]
+# mixed into a hash to tell apart the same cells with the other side to move
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+
+
+def popcount(mask):
+    """Number of set bits in a mask"""
+    return bin(mask).count("1")
+
+
+# fall back to bin().count on pythons without int.bit_count
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+
+
+def cell_bit(row, col):
+    """Bit of the mask that stores the given cell"""
+    return 1 << (col * HEIGHT + row)
+
+
+class Bitboard:
+    """
+    Connect 4 position stored as one 64-bit mask per piece plus the height of every column.
+    Bit (column * 7 + row) of a mask is set when that cell holds the piece, row 0 being the bottom row
+    like in the NumPy boards used by the game.
+    """
+
+    def __init__(self):
+        # masks[piece] holds the cells of that piece, index 0 is unused so pieces 1 and 2 index directly
+        self.masks = [0, 0, 0]
+        # number of pieces in each column, which is also the row of the next free cell
+        self.heights = [0] * NUM_COLUMNS
+        self.num_moves = 0
+        # Zobrist hash of the cells, updated on every play and undo
+        self.hash = 0
+        # undo stack of (column, piece) for every move played so far, the last entry is the last move
+        # (boards converted with from_array list their pieces column by column instead)
+        self.history = []
+
+    @classmethod
+    def from_array(cls, board):
+        """
+        Build a position from a 6x7 NumPy board
+        Args:
+            board: board where 0 is empty and 1 / 2 are the pieces
+        Returns: the equivalent Bitboard
+        """
+        position = cls()
+        for col in range(NUM_COLUMNS):
+            for row in range(NUM_ROWS):
+                piece = int(board[row][col])
+                if piece == 0:
+                    break
+                position.masks[piece] |= cell_bit(row, col)
+                position.hash ^= ZOBRIST_KEYS[piece][col * HEIGHT + row]
+                position.heights[col] += 1
+                position.num_moves += 1
+                position.history.append((col, piece))
+        return position
+
+    def to_array(self):
+        """Convert the position back into a 6x7 NumPy board"""
+        board = np.zeros((NUM_ROWS, NUM_COLUMNS))
+        for piece in (1, 2):
+            for col in range(NUM_COLUMNS):
+                for row in range(self.heights[col]):
+                    if self.masks[piece] & cell_bit(row, col):
+                        board[row][col] = piece
+        return board
+
+    def copy(self):
+        """Independent copy of the position"""
+        position = Bitboard.__new__(Bitboard)
+        position.masks = self.masks[:]
+        position.heights = self.heights[:]
+        position.num_moves = self.num_moves
+        position.hash = self.hash
+        position.history = self.history[:]
+        return position
+
+    def can_play(self, col):
+        return self.heights[col] < NUM_ROWS
+
+    def valid_moves(self):
+        return [col for col in range(NUM_COLUMNS) if self.heights[col] < NUM_ROWS]
+
+    def is_full(self):
+        return self.num_moves == NUM_ROWS * NUM_COLUMNS
+
+    def play(self, col, piece):
+        """
+        Drop a piece into a column
+        Args:
+            col: column to play, must not be full
+            piece: piece to drop
+        Returns: the row the piece landed on
+        """
+        row = self.heights[col]
+        index = col * HEIGHT + row
+        self.masks[piece] |= 1 << index
+        self.hash ^= ZOBRIST_KEYS[piece][index]
+        self.heights[col] = row + 1
+        self.num_moves += 1
+        self.history.append((col, piece))
+        return row
+
+    def undo(self):
+        """
+        Take back the last move played, so searches can make and unmake moves in place
+        Returns: the column the move was undone from
+        """
+        col, piece = self.history.pop()
+        row = self.heights[col] - 1
+        index = col * HEIGHT + row
+        self.masks[piece] ^= 1 << index
+        self.hash ^= ZOBRIST_KEYS[piece][index]
+        self.heights[col] = row
+        self.num_moves -= 1
+        return col
+
+    def undo_to(self, num_moves):
+        """Undo moves until only num_moves are left on the board"""
+        while self.num_moves > num_moves:
+            self.undo()
+
+    def has_won(self, piece):
+        """Whether the piece has four in a row anywhere on the board, using shift-and-AND tests"""
+        mask = self.masks[piece]
+        for shift in DIRECTIONS:
+            pairs = mask & (mask >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def last_move_wins(self):
+        """Whether the last move played completed a four in a row, only checking the lines through its cell"""
+        col, piece = self.history[-1]
+        mask = self.masks[piece]
+        for window in CELL_WINDOW_MASKS[col * HEIGHT + self.heights[col] - 1]:
+            if mask & window == window:
+                return True
+        return False
+
+    def last_move_winning_cells(self):
+        """
+        Cells of the four in a row completed by the last move
+        Returns: list of [row, column] pairs, empty if the last move did not win
+        """
+        col, piece = self.history[-1]
+        mask = self.masks[piece]
+        for window in CELL_WINDOW_MASKS[col * HEIGHT + self.heights[col] - 1]:
+            if mask & window == window:
+                return mask_cells(window)
+        return []
+
+    def winning_cells(self, piece):
+        """
+        Cells of a four in a row for the piece
+        Returns: list of [row, column] pairs, empty if the piece has not won
+        """
+        mask = self.masks[piece]
+        for shift in DIRECTIONS:
+            pairs = mask & (mask >> shift)
+            fours = pairs & (pairs >> (2 * shift))
+            if fours:
+                start = fours & -fours
+                return mask_cells(start | start << shift | start << (2 * shift) | start << (3 * shift))
+        return []
+
+
+def mask_cells(mask):
+    """[row, column] pairs of the cells set in a mask, bottom-left first"""
+    cells = []
+    while mask:
+        index = (mask & -mask).bit_length() - 1
+        cells.append([index % HEIGHT, index // HEIGHT])
+        mask &= mask - 1
+    return cells
+
+
+def _build_windows():
+    # every group of four cells in a line, in the same order score_position walks them
+    windows = []
+    for row in range(NUM_ROWS):
+        for col in range(NUM_COLUMNS - 3):
+            windows.append([(row, col + i) for i in range(4)])
+    for col in range(NUM_COLUMNS):
+        for row in range(NUM_ROWS - 3):
+            windows.append([(row + i, col) for i in range(4)])
+    for row in range(NUM_ROWS - 3):
+        for col in range(NUM_COLUMNS - 3):
+            windows.append([(row + i, col + i) for i in range(4)])
+    for row in range(NUM_ROWS - 3):
+        for col in range(NUM_COLUMNS - 3):
+            windows.append([(NUM_ROWS - 1 - row - i, col + i) for i in range(4)])
+    return windows
+
+
+WINDOWS = _build_windows()
+NUM_WINDOWS = len(WINDOWS)
+# masks of all 69 four-cell windows and of the center column
+WINDOW_MASKS = [sum(cell_bit(r, c) for r, c in window) for window in WINDOWS]
+# for every bit index, the numbers of the windows that contain that cell, and their masks
+CELL_WINDOWS = [[w for w, window in enumerate(WINDOW_MASKS) if window >> index & 1]
+                for index in range(NUM_COLUMNS * HEIGHT)]
+CELL_WINDOW_MASKS = [[WINDOW_MASKS[w] for w in windows] for windows in CELL_WINDOWS]
+CENTER_MASK = sum(cell_bit(row, NUM_COLUMNS // 2) for row in range(NUM_ROWS))
+
+# the same windows for flattened NumPy boards (cell = row * 7 + column): WINDOW_CELL_INDICES[w] are the four
+# cells of window w, and one extra window made of the always-empty padding cell 42 follows the real ones
+PADDING_CELL = NUM_ROWS * NUM_COLUMNS
+WINDOW_CELL_INDICES = np.array([[r * NUM_COLUMNS + c for r, c in window] for window in WINDOWS]
+                               + [[PADDING_CELL] * 4], dtype=np.intp)
+# CELL_WINDOW_INDICES[cell] lists the windows through a cell, padded with the empty window to the same length
+_cell_windows = [CELL_WINDOWS[(cell % NUM_COLUMNS) * HEIGHT + cell // NUM_COLUMNS]
+                 for cell in range(NUM_ROWS * NUM_COLUMNS)]
+_max_cell_windows = max(len(windows) for windows in _cell_windows)
+CELL_WINDOW_INDICES = np.array([windows + [NUM_WINDOWS] * (_max_cell_windows - len(windows))
+                                for windows in _cell_windows], dtype=np.intp)
+
+# weights of the score_position heuristic: the score of a window by the number of the scored piece's discs in
+# it, and of every disc in the center column
+WINDOW_SCORES = (0, 0, 1, 3, 100)
+CENTER_WEIGHT = 3
@@ -15,7 +15,10 @@ class Button():
         self.base_color = base_color
         self.hovering_color = hovering_color
         self.text_input = text_input
-        self.text = self.font.render(self.text_input, True, self.base_color)
+        # the text is rendered once in each color, hovering only switches between the two surfaces
+        self.base_text = self.font.render(self.text_input, True, self.base_color)
+        self.hovering_text = self.font.render(self.text_input, True, self.hovering_color)
+        self.text = self.base_text
         self.text_rectangle = self.text.get_rect(center=(self.x_position, self.y_position))
 
     def update_button(self, screen):
@@ -33,9 +36,7 @@ class Button():
             position: position of the mouse on the screen
         Returns: if the mouse position is on the button
         """
-        if position[0] in range(self.text_rectangle.left, self.text_rectangle.right) and position[1] in range(self.text_rectangle.top, self.text_rectangle.bottom):
-            return True
-        return False
+        return self.text_rectangle.collidepoint(position)
 
     def change_button_color(self, position):
         """
@@ -43,7 +44,7 @@ class Button():
         Args:
             position: position of the mouse on the screen
         """
-        if position[0] in range(self.text_rectangle.left, self.text_rectangle.right) and position[1] in range(self.text_rectangle.top, self.text_rectangle.bottom):
-            self.text = self.font.render(self.text_input, True, self.hovering_color)
+        if self.check_for_button_input(position):
+            self.text = self.hovering_text
         else:
-            self.text = self.font.render(self.text_input, True, self.base_color)
\ No newline at end of file
+            self.text = self.base_text
\ No newline at end of file
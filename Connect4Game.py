@@ -4,7 +4,10 @@ import math
 import pygame
 import sys
 from AIAlgorithm import AIAlgorithm
+from AIWorker import AIWorker
+from Bitboard import Bitboard
 from Button import Button
+from PositionCache import open_cache
 
 class Connect4Game:
     def __init__(self):
@@ -31,22 +34,38 @@ class Connect4Game:
         self.turn = random.choice([0, 1])
         self.turn = 0
         self.board = self.create_board()
+        # bitboard copy of the board, its column heights give the landing row of every move
+        self.position = Bitboard()
         self.game_mode = None
         self.difficulty = None
 
         # initialize graphical interface
         pygame.init()
-        self.screen_font = pygame.font.SysFont("monospace", 75)
+        self.fonts = {} # fonts by (name, size), loaded once
+        self.screen_font = self.get_font("monospace", 75)
         self.screen = pygame.display.set_mode(self.screen_dimensions)
         pygame.display.set_caption("Connect 4")
+        self.clock = pygame.time.Clock()
+        self.FPS = 60 # frame rate of the game loop while the AI is thinking
+        self.MENU_FPS = 30 # frame rate of the menu screens
+        self.grid_surface = self.build_grid_surface() # empty grid, rendered once
+        self.dirty_rects = [] # screen areas drawn on since the last display update
 
         # AI constants for AIAlgorithm
         self.PLAYER_PIECE = 1
         self.AI_PIECE = 2
-        self.ai = AIAlgorithm(self.AI_PIECE, self.PLAYER_PIECE)
-        self.DEPTH = 3
-        self.ALPHA = -math.inf
-        self.BETA = math.inf
+        self.OPENING_BOOK_PATH = None # e.g. "opening_book.bin" built by OpeningBook.py, for medium and hard mode
+        self.ai = AIAlgorithm(self.AI_PIECE, self.PLAYER_PIECE, opening_book_path=self.OPENING_BOOK_PATH)
+        # SQLite file of search results kept across sessions, off by default: a cached position always gets the
+        # same move, which takes away the variety of medium and hard mode and the subtree pondering grew
+        self.POSITION_CACHE_PATH = None
+        if self.POSITION_CACHE_PATH:
+            self.ai.position_cache = open_cache(self.POSITION_CACHE_PATH)
+        self.TIME_BUDGET_MS = 500 # time medium mode may think for each move
+        self.AI_MOVE_DELAY_MS = 500 # the AI never moves sooner than this, for realism
+        self.ai_worker = AIWorker(self.ai) # background thread the AI searches on
+        self.PONDER = True # let the AI search on the player's time in medium and hard mode
+        self.pondered_moves = -1 # number of moves on the board when pondering last started
 
     def create_board(self):
         """
@@ -54,137 +73,154 @@ class Connect4Game:
         """
         return np.zeros((self.num_rows, self.num_columns))
 
-    # generate a main menu on the screen
-    def menu(self):
-        """Ask the user to select the game mode."""
-        while True:
-            self.reset_game()
-            self.game_mode = None
-            self.difficulty = None
-
-            # create main menu screen
-            self.screen.fill(self.gray)
-            connect_4_text = self.screen_font.render(f"Connect 4", 1, self.blue)
-            self.screen.blit(connect_4_text, (self.screen_width / 4 - 20, 60))
-            main_menu_text = self.screen_font.render(f"Main Menu", 1, self.blue)
-            self.screen.blit(main_menu_text, (self.screen_width / 4 - 20, 150))
-            play_button = Button(position=(self.screen_width / 2, 350), text_input="Play", font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-            quit_button = Button(position=(self.screen_width / 2, 550), text_input="Quit", font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-
-            mouse_position = pygame.mouse.get_pos() # tracking mouse position in main menu
-
-            # this highlights button that mouse is currently on
-            for button in [play_button, quit_button]:
-                button.change_button_color(mouse_position)
-                button.update_button(self.screen)
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if play_button.check_for_button_input(mouse_position):  # click play button goes to single or two player mode screen
-                        self.one_player_or_two_player_menu()
-                    if quit_button.check_for_button_input(mouse_position):  # click quit closes program
-                        pygame.quit()
-                        sys.exit()
+    def get_font(self, name, size):
+        """
+        Fonts are loaded once and shared by every screen
+        Args:
+            name: system font name
+            size: font size
+        Returns: the cached font
+        """
+        if (name, size) not in self.fonts:
+            self.fonts[(name, size)] = pygame.font.SysFont(name, size)
+        return self.fonts[(name, size)]
 
-            pygame.display.update()
+    def create_button(self, y_position, text):
+        """
+        Creates a menu button centered horizontally on the screen
+        """
+        return Button(position=(self.screen_width / 2, y_position), text_input=text, font=self.screen_font,
+                      base_color=self.blue, hovering_color=self.green)
 
-    def one_player_or_two_player_menu(self):
+    def run_menu(self, texts, buttons):
         """
-        Creating play screen to choose between 1 player and 2 players options
+        Shows a menu screen until one of its buttons is clicked, drawing at most MENU_FPS frames per second
+        Args:
+            texts: list of (text surface, position) shown above the buttons
+            buttons: dict from a name to each button of the menu
+        Returns: the name of the clicked button
         """
         while True:
-            # creating game mode selection screen
             self.screen.fill(self.gray)
-            single_player_button = Button(position=(self.screen_width / 2, 150), text_input="1 Player", font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-            two_players_button = Button(position=(self.screen_width / 2, 350), text_input="2 Players", font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-            back_button = Button(position=(self.screen_width / 2, 550), text_input="Back", font=self.screen_font, base_color=self.blue, hovering_color=self.green)
+            for text, position in texts:
+                self.screen.blit(text, position)
 
-            mouse_position = pygame.mouse.get_pos() # tracking mouse position in game mode menu
+            mouse_position = pygame.mouse.get_pos() # tracking mouse position in the menu
 
             # this highlights button that mouse is currently on
-            for button in [single_player_button, two_players_button, back_button]:
+            for button in buttons.values():
                 button.change_button_color(mouse_position)
                 button.update_button(self.screen)
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
+                    self.quit_game()
                 if event.type == pygame.MOUSEBUTTONDOWN:
-                    if single_player_button.check_for_button_input(mouse_position): # click single player button goes to select difficulty screen
-                        self.game_mode = "PvAI"
-                        self.choose_difficulty_level_menu()
-                        if self.game_over:
-                            return
-                    if two_players_button.check_for_button_input(mouse_position): # click two player button goes to play a 2 player game
-                        self.game_mode = "PvP"
-                        self.start_game()
-                        return
-                    if back_button.check_for_button_input(mouse_position): # click back button goes back to main menu
-                        return
+                    for name, button in buttons.items():
+                        if button.check_for_button_input(mouse_position):
+                            return name
 
             pygame.display.update()
+            self.clock.tick(self.MENU_FPS) # menus only wait for the mouse, no need to redraw them any faster
 
-    def choose_difficulty_level_menu(self):
+    def quit_game(self):
         """
-        creating a choose difficulty level for single player mode
+        Stops any AI search still running and closes the game
         """
+        self.ai_worker.cancel()
+        pygame.quit()
+        sys.exit()
+
+    # generate a main menu on the screen
+    def menu(self):
+        """Ask the user to select the game mode."""
+        # create main menu screen
+        texts = [(self.screen_font.render(f"Connect 4", 1, self.blue), (self.screen_width / 4 - 20, 60)),
+                 (self.screen_font.render(f"Main Menu", 1, self.blue), (self.screen_width / 4 - 20, 150))]
+        buttons = {"play": self.create_button(350, "Play"), "quit": self.create_button(550, "Quit")}
         while True:
-            # creating difficulty level selection screen
-            self.screen.fill(self.gray)
-            difficulty_screen_font = pygame.font.SysFont("monospace", 60)
-            difficulty_mode_text = difficulty_screen_font.render(f"AI Difficulty Mode", 1, self.blue)
-            self.screen.blit(difficulty_mode_text, (30, 60))
-            easy_mode_button = Button(position=(self.screen_width / 2, 200), text_input="Easy",
-                                          font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-            medium_mode_button = Button(position=(self.screen_width / 2, 350), text_input="Medium",
-                                        font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-            hard_mode_button = Button(position=(self.screen_width / 2, 500), text_input="Hard", font=self.screen_font,
-                                 base_color=self.blue, hovering_color=self.green)
-            back_button = Button(position=(self.screen_width / 2, 650), text_input="Back", font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-
-            mouse_position = pygame.mouse.get_pos() # tracking mouse position in difficulty selection menu
+            self.reset_game()
+            self.game_mode = None
+            self.difficulty = None
 
-            # this highlights button that mouse is currently on
-            for button in [easy_mode_button, medium_mode_button,hard_mode_button, back_button]:
-                button.change_button_color(mouse_position)
-                button.update_button(self.screen)
+            clicked = self.run_menu(texts, buttons)
+            if clicked == "play": # click play button goes to single or two player mode screen
+                self.one_player_or_two_player_menu()
+            else: # click quit closes program
+                self.quit_game()
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if easy_mode_button.check_for_button_input(mouse_position): # click easy button to play against easy AI
-                        self.difficulty = "easy"
-                        self.start_game()
-                        return
-                    if medium_mode_button.check_for_button_input(mouse_position): # click medium button to play against medium AI
-                        self.difficulty = "medium"
-                        self.start_game()
-                        return
-                    if hard_mode_button.check_for_button_input(mouse_position): # click hard button to play against hard AI
-                        self.difficulty = "hard"
-                        self.start_game()
-                        return
-                    if back_button.check_for_button_input(mouse_position): # click back button to go back to choose between 1 and 2 player options
-                        return
+    def one_player_or_two_player_menu(self):
+        """
+        Creating play screen to choose between 1 player and 2 players options
+        """
+        # creating game mode selection screen
+        buttons = {"single_player": self.create_button(150, "1 Player"),
+                   "two_players": self.create_button(350, "2 Players"),
+                   "back": self.create_button(550, "Back")}
+        while True:
+            clicked = self.run_menu([], buttons)
+            if clicked == "single_player": # click single player button goes to select difficulty screen
+                self.game_mode = "PvAI"
+                self.choose_difficulty_level_menu()
+                if self.game_over:
+                    return
+            if clicked == "two_players": # click two player button goes to play a 2 player game
+                self.game_mode = "PvP"
+                self.start_game()
+                return
+            if clicked == "back": # click back button goes back to main menu
+                return
 
-            pygame.display.update()
+    def choose_difficulty_level_menu(self):
+        """
+        creating a choose difficulty level for single player mode
+        """
+        # creating difficulty level selection screen
+        difficulty_screen_font = self.get_font("monospace", 60)
+        texts = [(difficulty_screen_font.render(f"AI Difficulty Mode", 1, self.blue), (30, 60))]
+        buttons = {"easy": self.create_button(200, "Easy"), "medium": self.create_button(350, "Medium"),
+                   "hard": self.create_button(500, "Hard"), "back": self.create_button(650, "Back")}
+        clicked = self.run_menu(texts, buttons)
+        if clicked != "back": # click a difficulty button to play against that AI, back goes back to choose between 1 and 2 player options
+            self.difficulty = clicked
+            self.start_game()
+
+    def build_grid_surface(self):
+        """
+        Pre-render the empty game board, so drawing the board is a single blit instead of 42 cells
+        Returns: surface of the grid, one square per cell with an empty hole in it
+        """
+        grid_surface = pygame.Surface((self.screen_width, self.num_rows * self.square_size))
+        for column in range(self.num_columns):
+            for row in range(self.num_rows):
+                pygame.draw.rect(grid_surface, self.gray, (column * self.square_size, row * self.square_size,
+                                                           self.square_size, self.square_size))
+                pygame.draw.circle(grid_surface, self.white, (int((column + 0.5) * self.square_size),
+                                                              int((row + 0.5) * self.square_size)), self.circle_radius)
+        return grid_surface
 
     def draw_grid(self):
         """
         Draw game board on screen
         """
-        for column in range(self.num_columns):
-            for row in range(self.num_rows):
-                pygame.draw.rect(self.screen, self.gray,(column * self.square_size, (row + 1) * self.square_size,
-                                                    self.square_size, self.square_size))
-                pygame.draw.circle(self.screen, self.white,(int((column + 0.5) * self.square_size),
-                                                       int((row + 1.5) * self.square_size)), self.circle_radius)
+        self.screen.blit(self.grid_surface, (0, self.square_size))
+
+    def cell_rectangle(self, row, column):
+        """
+        Screen area of a board cell, row 0 being the bottom row
+        """
+        return pygame.Rect(column * self.square_size, self.screen_height - (row + 1) * self.square_size,
+                           self.square_size, self.square_size)
+
+    def draw_piece(self, row, column, piece):
+        """
+        Draw one player piece on screen
+        Returns: the screen area of its cell
+        """
+        color = self.pink if piece == 1 else self.orange
+        pygame.draw.circle(self.screen, color, (int((column + 0.5) * self.square_size),
+                                                self.screen_height - int((row + 0.5) * self.square_size)), self.circle_radius)
+        return self.cell_rectangle(row, column)
 
     def draw_pieces(self):
         """
@@ -192,12 +228,8 @@ class Connect4Game:
         """
         for column in range(self.num_columns):
             for row in range(self.num_rows):
-                if self.board[row][column] == 1:
-                    pygame.draw.circle(self.screen, self.pink, (int((column + 0.5) * self.square_size),
-                                                          self.screen_height - int((row + 0.5) * self.square_size)), self.circle_radius)
-                elif self.board[row][column] == 2:
-                    pygame.draw.circle(self.screen, self.orange, (int((column + 0.5) * self.square_size),
-                                                             self.screen_height - int((row + 0.5) * self.square_size)),self.circle_radius)
+                if self.board[row][column] != 0:
+                    self.draw_piece(row, column, self.board[row][column])
 
     def draw_board(self):
         """
@@ -205,18 +237,43 @@ class Connect4Game:
         """
         self.draw_grid()
         self.draw_pieces()
+        self.dirty_rects = []
         pygame.display.update()
 
+    def update_display(self):
+        """
+        Show only the screen areas drawn on since the last update
+        """
+        if self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+            self.dirty_rects = []
+
+    def mark_winning_pieces(self):
+        """
+        Draw a triangle on each of the four winning pieces and mark their cells for the next display update
+        """
+        for row, column in self.ai.winning_pieces[:4]:
+            piece_center_coordinates = ((column + 0.5) * self.square_size, self.screen_width - (row + 0.5) * self.square_size)
+            triangle_coordinate_list = [
+                (piece_center_coordinates[0], piece_center_coordinates[1] - self.circle_radius),
+                (piece_center_coordinates[0] + int(self.circle_radius * math.sin(math.radians(45))),
+                 piece_center_coordinates[1] + int(self.circle_radius * math.sin(math.radians(45)))),
+                (piece_center_coordinates[0] - int(self.circle_radius * math.sin(math.radians(45))),
+                 piece_center_coordinates[1] + int(self.circle_radius * math.sin(math.radians(45))))]
+            pygame.draw.polygon(surface=self.screen, color=self.green, points=triangle_coordinate_list)
+            self.dirty_rects.append(self.cell_rectangle(row, column))
+
     def drop_player_piece(self,row, column, piece):
         """
-        Draw the piece that a player played
+        Draw the piece that a player played, only its cell is redrawn and updated
         Args:
             row: the row the player's piece is played on
             column: the column the player's piece is played on
             piece: whether player 1 or player 2 played the piece
         """
         self.board[row][column] = piece
-        self.draw_board()
+        self.dirty_rects.append(self.draw_piece(row, column, piece))
+        self.update_display()
 
     def make_move(self, col, piece):
         """
@@ -226,59 +283,95 @@ class Connect4Game:
             piece: whether player 1 or player 2 played the piece
         Returns: whether a move was made on the board or not
         """
-        if self.ai.is_valid_location(self.board, col): # if the move is valid, place piece down and return true, or else return false
-            row = next(r for r in range(6) if self.board[r][col] == 0)
+        if self.position.can_play(col): # if the move is valid, place piece down and return true, or else return false
+            row = self.position.play(col, piece)
             self.drop_player_piece(row, col, piece)
 
-            if self.ai.check_win(self.board, piece, self.num_columns, self.num_rows): # checks if a player has won or not
+            winning_cells = self.position.last_move_winning_cells() # checks if this move won, giving the winning pieces
+            if winning_cells:
+                self.ai_worker.cancel() # stop pondering, the CPU stays idle through the wait and the restart screen
                 self.game_over = True
                 self.ai.game_over = True
-                self.ai.check_win(self.board, piece, self.num_columns, self.num_rows) # gets list of winning pieces
+                self.ai.winning_pieces = winning_cells
 
                 if piece == self.PLAYER_PIECE: # player wins
                     winning_label = self.screen_font.render(f"Player 1 wins!", 1, self.pink)
                 else: # player 2 / AI wins
                     winning_label = self.screen_font.render(f"Player 2 wins!", 1, self.orange)
-                self.screen.blit(winning_label, (40, 10))
+                self.dirty_rects.append(self.screen.blit(winning_label, (40, 10)))
 
                 # marks winning pieces on board
-                for i in range(4):
-                    piece_center_coordinates = ((self.ai.winning_pieces[i][1] + 0.5) * self.square_size,
-                                                self.screen_width - (
-                                                            self.ai.winning_pieces[i][0] + 0.5) * self.square_size)
-                    triangle_coordinate_list = [
-                        (piece_center_coordinates[0], piece_center_coordinates[1] - self.circle_radius),
-                        (piece_center_coordinates[0] + int(self.circle_radius * math.sin(math.radians(45))),
-                         piece_center_coordinates[1] + int(self.circle_radius * math.sin(math.radians(45)))),
-                        (piece_center_coordinates[0] - int(self.circle_radius * math.sin(math.radians(45))),
-                         piece_center_coordinates[1] + int(self.circle_radius * math.sin(math.radians(45))))]
-                    pygame.draw.polygon(surface=self.screen, color=self.green, points=triangle_coordinate_list)
-                pygame.display.update()
+                self.mark_winning_pieces()
+                self.update_display()
                 return True
 
-            self.draw_board() # draws updated board if nobody has won yet
-            return True
+            return True # the new piece is already drawn if nobody has won yet
 
         return False
 
-    def ai_move(self):
+    def choose_ai_move(self, position):
         """
-        Determines how the AI makes it move in single player mode
+        Searches for the AI's move, this runs on the AI worker thread
+        Args:
+            position: copy of the game position to search
+        Returns: the column to play, None if there's no valid move
         """
-        valid_moves = self.ai.get_valid_locations(self.board) # checks for any valid moves on the board
-        if not valid_moves: # if there's no valid moves, the game is over and return false
-            self.game_over = True
-            return False
+        valid_moves = self.ai.get_valid_locations(position) # checks for any valid moves on the board
+        if not valid_moves:
+            return None
 
         if self.difficulty == 'easy': # easy mode: random move selection
-            col = self.ai.random_move(self.board)
+            col = self.ai.random_move(position)
         elif self.difficulty == "medium": # medium mode: minmax with alpha-beta pruning
-            col, _ = self.ai.minimax(self.board, self.DEPTH, self.ALPHA, self.BETA, True)
+            col, _ = self.ai.search(position, self.TIME_BUDGET_MS)
         else: # hard mode: monte carlo tree search
-            col = self.ai.monte_carlo_tree_search(self.board)
+            col = self.ai.monte_carlo_tree_search(position)
 
         if col == -1 or col not in valid_moves: # Check if we got a valid column or else just pick the first valid move
-            col = valid_moves[0] if valid_moves else 0
+            col = valid_moves[0]
+        return col
+
+    def ponder_ai_move(self, position):
+        """
+        Searches the player's likely replies on the AI worker thread while the player thinks, until the
+        player's move cancels it
+        Args:
+            position: copy of the game position, with the player to move
+        """
+        self.ai.ponder(position, "mcts" if self.difficulty == "hard" else "minimax")
+
+    def start_pondering(self):
+        """
+        Starts pondering once per player turn in single player mode, starting the AI's move cancels it
+        """
+        if (self.PONDER and self.game_mode == "PvAI" and self.difficulty in ("medium", "hard")
+                and self.pondered_moves != self.position.num_moves):
+            self.pondered_moves = self.position.num_moves
+            self.ai_worker.start(self.ponder_ai_move, self.position)
+
+    def wait_for_ai_move(self):
+        """
+        Runs the AI's search in the background while the window keeps handling events and redrawing
+        Returns: the column the AI chose, None if there's no valid move
+        """
+        self.ai_worker.start(self.choose_ai_move, self.position) # this also stops any pondering
+        move_start = pygame.time.get_ticks()
+        while self.ai_worker.is_busy() or pygame.time.get_ticks() - move_start < self.AI_MOVE_DELAY_MS:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT: # stop the search before closing the window
+                    self.quit_game()
+            self.update_display()
+            self.clock.tick(self.FPS)
+        return self.ai_worker.get_move()
+
+    def ai_move(self):
+        """
+        Determines how the AI makes it move in single player mode
+        """
+        col = self.wait_for_ai_move()
+        if col is None: # if there's no valid moves, the game is over and return false
+            self.game_over = True
+            return False
 
         self.make_move(col, self.AI_PIECE)  # AI makes the move
 
@@ -286,51 +379,33 @@ class Connect4Game:
         """
         Resets the Connect 4 game after it is finished
         """
+        self.ai_worker.cancel() # a search still running belongs to the old game
+        self.pondered_moves = -1
         self.game_over = False
         self.ai.game_over = False
         self.board = self.create_board()
+        self.position = Bitboard()
         self.ai.winning_pieces = []
+        self.ai.new_game()
 
     def restart_screen(self):
         """
         This screen gives the player options to play the same game mode again, go back to the main menu to choose a
         different game mode, or quit the game
         """
-        while True:
-            # creating after game selection screen
-            self.screen.fill(self.gray)
-            play_again_button = Button(position=(self.screen_width / 2, 200), text_input="Play Again",
-                                          font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-            main_menu_button = Button(position=(self.screen_width / 2, 350), text_input="Main Menu",
-                                        font=self.screen_font, base_color=self.blue, hovering_color=self.green)
-            quit_button = Button(position=(self.screen_width / 2, 500), text_input="Quit", font=self.screen_font,
-                                 base_color=self.blue, hovering_color=self.green)
-
-            mouse_position = pygame.mouse.get_pos() # tracking mouse position in after game selection menu
-
-            # this highlights button that mouse is currently on
-            for button in [play_again_button, main_menu_button, quit_button]:
-                button.change_button_color(mouse_position)
-                button.update_button(self.screen)
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if play_again_button.check_for_button_input(mouse_position): # click play button restarts the game for player to play again
-                        self.reset_game()
-                        self.screen.fill(self.white)
-                        self.draw_board()
-                        self.turn = random.choice([0, 1])
-                        return
-                    if main_menu_button.check_for_button_input(mouse_position): # click main menu button goes back to Connect 4 main menu
-                        return
-                    if quit_button.check_for_button_input(mouse_position): # click quit button exits Connect 4 application
-                        pygame.quit()
-                        sys.exit()
-
-            pygame.display.update()
+        # creating after game selection screen
+        buttons = {"play_again": self.create_button(200, "Play Again"),
+                   "main_menu": self.create_button(350, "Main Menu"),
+                   "quit": self.create_button(500, "Quit")}
+        clicked = self.run_menu([], buttons)
+        if clicked == "play_again": # click play button restarts the game for player to play again
+            self.reset_game()
+            self.screen.fill(self.white)
+            self.draw_board()
+            self.turn = random.choice([0, 1])
+        elif clicked == "quit": # click quit button exits Connect 4 application
+            self.quit_game()
+        # click main menu button goes back to Connect 4 main menu
 
     def start_game(self):
         """
@@ -342,58 +417,41 @@ class Connect4Game:
         self.draw_board()
         while not self.game_over:
             if self.game_mode == "PvAI" and self.turn == 1 and not self.game_over: # If it's AI's turn, make the move automatically
-                pygame.time.wait(500)  # Add a slight delay for realism
-                self.ai_move()
+                self.ai_move() # the AI thinks in the background, at least AI_MOVE_DELAY_MS for realism
                 self.turn = 0  # Switch back to player
-                if self.game_over: # if game is over, mark out winning pieces and go to restart_screen
-                    for i in range(4):
-                        piece_center_coordinates = ((self.ai.winning_pieces[i][1] + 0.5) * self.square_size,
-                                                    self.screen_width - (
-                                                                self.ai.winning_pieces[i][0] + 0.5) * self.square_size)
-                        triangle_coordinate_list = [
-                            (piece_center_coordinates[0], piece_center_coordinates[1] - self.circle_radius),
-                            (piece_center_coordinates[0] + int(self.circle_radius * math.sin(math.radians(45))),
-                             piece_center_coordinates[1] + int(self.circle_radius * math.sin(math.radians(45)))),
-                            (piece_center_coordinates[0] - int(self.circle_radius * math.sin(math.radians(45))),
-                             piece_center_coordinates[1] + int(self.circle_radius * math.sin(math.radians(45))))]
-                        pygame.draw.polygon(surface=self.screen, color=self.green, points=triangle_coordinate_list)
+                if self.game_over: # if game is over, the winning pieces are already marked by make_move, go to restart_screen
                     pygame.time.wait(4000)
                     self.restart_screen()
                     if self.game_over: # this goes back to main menu
                         return
 
             else:
+                self.start_pondering() # the AI thinks on the player's time in single player mode
+                self.update_display() # one display update per frame for all the mouse motion since the last one
+                self.clock.tick(self.FPS) # leave the CPU to the pondering thread between frames
                 for event in pygame.event.get():
                     if event.type == pygame.QUIT:
-                        sys.exit()
+                        self.quit_game()
 
                     if event.type == pygame.MOUSEMOTION: # Make sure the piece follows the mouse
-                        pygame.draw.rect(self.screen, self.white, (0, 0, self.screen_width, self.square_size))  # this keeps background of where mouse is moving to be white
+                        top_row = pygame.draw.rect(self.screen, self.white, (0, 0, self.screen_width, self.square_size))  # this keeps background of where mouse is moving to be white
                         x_position = event.pos[0] # tracking position of mouse
                         if self.turn == 0:  # Player1's turn
                             pygame.draw.circle(self.screen, self.pink, (x_position, int(self.square_size / 2)), self.circle_radius)
                         else:  # another player's turn
                             pygame.draw.circle(self.screen, self.orange, (x_position, int(self.square_size / 2)), self.circle_radius)
-                    pygame.display.update()
+                        self.dirty_rects.append(top_row) # only the row above the board changed
 
                     if event.type == pygame.MOUSEBUTTONDOWN:
-                        pygame.draw.rect(self.screen, self.white, (0, 0, self.screen_width, self.square_size))
+                        self.dirty_rects.append(pygame.draw.rect(self.screen, self.white, (0, 0, self.screen_width, self.square_size)))
                         x_position = event.pos[0]
                         col = int(math.floor(x_position / self.square_size))    # column that player will place piece down on
 
                         if self.make_move(col, self.turn + 1):  # current player takes turn
                             self.turn = 1 - self.turn   # Switch player
-                        self.draw_board() # update board
-
-                        if self.game_over:  # if game is over, mark out winning pieces and go to restart_screen
-                            for i in range(4):
-                                piece_center_coordinates = ((self.ai.winning_pieces[i][1] + 0.5) * self.square_size,
-                                                            self.screen_width - (self.ai.winning_pieces[i][0] + 0.5) * self.square_size)
-                                triangle_coordinate_list = [(piece_center_coordinates[0], piece_center_coordinates[1] - self.circle_radius),
-                                                        (piece_center_coordinates[0] + int(self.circle_radius * math.sin(math.radians(45))), piece_center_coordinates[1] + int(self.circle_radius * math.sin(math.radians(45)))),
-                                                        (piece_center_coordinates[0] - int(self.circle_radius * math.sin(math.radians(45))), piece_center_coordinates[1] + int(self.circle_radius * math.sin(math.radians(45))))]
-                                pygame.draw.polygon(surface=self.screen, color=self.green, points=triangle_coordinate_list)
-                            pygame.display.update()
+                        self.update_display() # update the row above the board
+
+                        if self.game_over:  # if game is over, the winning pieces are already marked by make_move, go to restart_screen
                             pygame.time.wait(4000)
                             self.restart_screen()
                             if self.game_over:
@@ -0,0 +1,56 @@
+import math
+
+
+class MCTSNode:
+    """
+    Node of the UCT search tree for the position reached by dropping piece into column move
+    """
+    __slots__ = ("parent", "move", "piece", "children", "untried_moves", "visits", "wins", "is_terminal", "winner")
+
+    def __init__(self, parent, move, piece, untried_moves, winner=None):
+        """
+        Args:
+            parent: node of the position before the move, None for the root
+            move: column played to reach this node
+            piece: piece that played the move, wins are counted for this piece
+            untried_moves: columns that have no child node yet
+            winner: for a finished game the winning piece or 0 for a draw, None while the game goes on
+        """
+        self.parent = parent
+        self.move = move
+        self.piece = piece
+        self.children = {}
+        self.untried_moves = untried_moves
+        self.visits = 0
+        # a win for piece counts 1, a draw 0.5
+        self.wins = 0.0
+        self.is_terminal = winner is not None
+        self.winner = winner
+
+    def select_child(self, exploration):
+        """
+        Child with the highest upper confidence bound (UCB1)
+        Args:
+            exploration: weight of the exploration term
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children.values(),
+                   key=lambda child: child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits))
+
+    def add_child(self, move, piece, untried_moves, winner=None):
+        """Create and return the child for a move"""
+        child = MCTSNode(self, move, piece, untried_moves, winner)
+        self.children[move] = child
+        return child
+
+    def update_counts(self, counts):
+        """
+        Count a batch of games through this node
+        Args:
+            counts: dict from winning piece (0 for a draw) to the number of games it won
+        """
+        self.visits += sum(counts.values())
+        self.wins += counts.get(self.piece, 0) + 0.5 * counts.get(0, 0)
+
+    def most_visited_child(self):
+        return max(self.children.values(), key=lambda child: child.visits)
@@ -0,0 +1,221 @@
+import os
+import math
+import time
+import struct
+import argparse
+import multiprocessing
+import numpy as np
+from Bitboard import Bitboard, HEIGHT, NUM_COLUMNS, NUM_ROWS
+
+# book file build_book writes by default, next to the modules
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+# file layout: header, then the sorted position keys (uint64), their scores (int32) and best moves (uint8),
+# each as one contiguous array so the keys can be binary searched straight from the mapped file
+BOOK_MAGIC = b"C4OB"
+BOOK_VERSION = 1
+# magic, version, number of entries, plies and search depth the book was built with
+BOOK_HEADER = struct.Struct("<4sIQII")
+# bottom cell of every column, added to a position's key so the column heights are part of it
+BOTTOM_MASK = sum(1 << (col * HEIGHT) for col in range(NUM_COLUMNS))
+COLUMN_MASK = (1 << HEIGHT) - 1
+
+# books opened in this process by path, shared by every AIAlgorithm like the endgame cache
+_open_books = {}
+
+
+def position_key(mover_mask, occupied_mask):
+    """
+    Unique key of a position seen from the side to move: its discs plus the occupied cells plus the bottom
+    row, which sets the bit above the top of every column so the heights can be told apart
+    """
+    return mover_mask + occupied_mask + BOTTOM_MASK
+
+
+def mirror_key(key):
+    """Key of the position mirrored left to right"""
+    mirrored = 0
+    for col in range(NUM_COLUMNS):
+        mirrored |= (key >> (col * HEIGHT) & COLUMN_MASK) << ((NUM_COLUMNS - 1 - col) * HEIGHT)
+    return mirrored
+
+
+def canonical_key(position, piece_to_move):
+    """
+    (key, mirrored) of a position: the smaller of its key and its mirror image's, and whether it was the
+    mirror image's, in which case the columns of the book entry are mirrored too
+    """
+    key = position_key(position.masks[piece_to_move], position.masks[1] | position.masks[2])
+    mirrored = mirror_key(key)
+    return (mirrored, True) if mirrored < key else (key, False)
+
+
+def open_book(path=DEFAULT_BOOK_PATH):
+    """Opening book at path, mapped once per process"""
+    if path not in _open_books:
+        _open_books[path] = OpeningBook(path)
+    return _open_books[path]
+
+
+class OpeningBook:
+    """
+    Best move and score of every opening position up to some number of plies, read from a file built
+    offline by build_book. The file is memory-mapped and only the pages a binary search touches are
+    read, so opening a book costs nothing and a lookup takes microseconds.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: book file written by build_book
+        """
+        with open(path, "rb") as book_file:
+            magic, version, count, self.plies, self.depth = BOOK_HEADER.unpack(book_file.read(BOOK_HEADER.size))
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            raise ValueError(f"{path} is not a version {BOOK_VERSION} opening book")
+        self.path = path
+        self.count = count
+        offset = BOOK_HEADER.size
+        self.keys = np.memmap(path, dtype="<u8", mode="r", offset=offset, shape=(count,)) if count else np.zeros(0)
+        offset += 8 * count
+        self.scores = np.memmap(path, dtype="<i4", mode="r", offset=offset, shape=(count,)) if count else None
+        offset += 4 * count
+        self.moves = np.memmap(path, dtype="u1", mode="r", offset=offset, shape=(count,)) if count else None
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, position, piece_to_move):
+        """
+        Book entry of a position
+        Args:
+            position: Bitboard
+            piece_to_move: side to move in the position
+        Returns: (best column, score for piece_to_move), None if the position is not in the book
+        """
+        if position.num_moves > self.plies:
+            return None
+        key, mirrored = canonical_key(position, piece_to_move)
+        index = int(self.keys.searchsorted(key))
+        if index == self.count or self.keys[index] != key:
+            return None
+        col = int(self.moves[index])
+        return (NUM_COLUMNS - 1 - col if mirrored else col), int(self.scores[index])
+
+
+def book_positions(plies):
+    """
+    Move lists of one position per canonical key reached in at most plies moves from the empty board,
+    piece 1 moving first, leaving out finished games
+    """
+    positions = []
+    seen = set()
+    frontier = [[]]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for moves in frontier:
+            position = Bitboard()
+            for i, col in enumerate(moves):
+                position.play(col, 1 + i % 2)
+            piece = 1 + ply % 2
+            key = canonical_key(position, piece)[0]
+            if key in seen:
+                continue
+            seen.add(key)
+            positions.append(moves)
+            if ply == plies:
+                continue
+            for col in position.valid_moves():
+                position.play(col, piece)
+                if not position.last_move_wins() and not position.is_full():
+                    next_frontier.append(moves + [col])
+                position.undo()
+        frontier = next_frontier
+    return positions
+
+
+# search settings of a book builder worker process, set by the pool initializer
+_worker_ai = None
+_worker_depth = None
+_worker_time_budget_ms = None
+
+
+def _init_worker(ai_algorithm_class, depth, time_budget_ms):
+    global _worker_ai, _worker_depth, _worker_time_budget_ms
+    _worker_ai = ai_algorithm_class(1, 2)
+    # the book must give the same answer every time, and must not answer its own searches
+    _worker_ai.randomize_ties = False
+    _worker_ai.opening_book = None
+    _worker_depth = depth
+    _worker_time_budget_ms = time_budget_ms
+
+
+def _search_book_position(moves):
+    """Search one book position in a worker process, returning (key, best column, score for the side to move)"""
+    position = Bitboard()
+    for i, col in enumerate(moves):
+        position.play(col, 1 + i % 2)
+    # the worker's AI plays whichever side is to move
+    piece = 1 + len(moves) % 2
+    _worker_ai.AI_PIECE, _worker_ai.PLAYER_PIECE = piece, 3 - piece
+    col, score = _worker_ai.search(position, _worker_time_budget_ms, max_depth=_worker_depth)
+    return canonical_key(position, piece)[0], col, int(score)
+
+
+def build_book(ai_algorithm_class, path, plies, depth, time_budget_ms=math.inf, workers=1):
+    """
+    Search every opening position and write the book file
+    Args:
+        ai_algorithm_class: AIAlgorithm class searching the positions
+        path: book file to write, replaced once the new book is complete
+        plies: deepest position in the book, in moves from the empty board
+        depth: search depth of every position
+        time_budget_ms: optional time limit of each search, by default only the depth limits it
+        workers: processes searching positions in parallel
+    Returns: number of positions in the book
+    """
+    # positions come shallowest first, and those take the longest to search, so the workers are not left
+    # waiting on a few slow searches at the end
+    positions = book_positions(plies)
+    initargs = (ai_algorithm_class, depth, time_budget_ms)
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            chunk_size = max(1, len(positions) // (workers * 16))
+            entries = list(pool.imap_unordered(_search_book_position, positions, chunk_size))
+    else:
+        _init_worker(*initargs)
+        entries = [_search_book_position(moves) for moves in positions]
+
+    entries.sort()
+    keys = np.array([key for key, _, _ in entries], dtype="<u8")
+    scores = np.array([score for _, _, score in entries], dtype="<i4")
+    moves = np.array([col for _, col, _ in entries], dtype="u1")
+    # write next to the old book and swap it in, so processes reading the old one never see half a file
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as book_file:
+        book_file.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(entries), plies, depth))
+        book_file.write(keys.tobytes())
+        book_file.write(scores.tobytes())
+        book_file.write(moves.tobytes())
+    os.replace(temporary_path, path)
+    _open_books.pop(path, None)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    from AIAlgorithm import AIAlgorithm
+
+    parser = argparse.ArgumentParser(description="Build the opening book by searching every early position")
+    parser.add_argument("--output", default=DEFAULT_BOOK_PATH, help="book file to write (default opening_book.bin)")
+    parser.add_argument("--plies", type=int, default=6, help="book positions up to this many moves (default 6)")
+    parser.add_argument("--depth", type=int, default=10, help="search depth of every position (default 10)")
+    parser.add_argument("--time-budget-ms", type=float, default=math.inf,
+                        help="optional time limit of every search, the depth limit only by default")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="processes searching positions (default one per CPU)")
+    args = parser.parse_args()
+    if not 0 <= args.plies < NUM_ROWS * NUM_COLUMNS:
+        parser.error("--plies must be between 0 and 41")
+
+    start_time = time.perf_counter()
+    count = build_book(AIAlgorithm, args.output, args.plies, args.depth, args.time_budget_ms, args.workers)
+    print(f"Wrote {count} positions to {args.output} in {time.perf_counter() - start_time:.1f}s")
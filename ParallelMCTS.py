@@ -0,0 +1,168 @@
+import random
+import multiprocessing
+from Bitboard import Bitboard
+from MCTSNode import MCTSNode
+
+# worker pools by (AIAlgorithm class, number of workers), shared by every ParallelMCTS in the process
+# so the worker processes are started once and not for every move or game
+_pools = {}
+
+# AIAlgorithm class and instances (by ai piece and player piece) inside a worker process
+_worker_ai_class = None
+_worker_ais = {}
+
+
+def get_pool(ai_algorithm_class, num_workers):
+    """Persistent pool of num_workers processes able to run ai_algorithm_class searches"""
+    key = (ai_algorithm_class, num_workers)
+    if key not in _pools:
+        _pools[key] = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(ai_algorithm_class,))
+    return _pools[key]
+
+
+def shutdown_pools():
+    """Stop every worker process started by get_pool"""
+    for pool in _pools.values():
+        pool.close()
+        pool.join()
+    _pools.clear()
+
+
+def _init_worker(ai_algorithm_class):
+    global _worker_ai_class
+    _worker_ai_class = ai_algorithm_class
+
+
+def _get_worker_ai(ai_piece, player_piece):
+    if (ai_piece, player_piece) not in _worker_ais:
+        _worker_ais[(ai_piece, player_piece)] = _worker_ai_class(ai_piece, player_piece)
+    return _worker_ais[(ai_piece, player_piece)]
+
+
+def _position_from_moves(moves):
+    position = Bitboard()
+    for col, piece in moves:
+        position.play(col, piece)
+    return position
+
+
+def _grow_root_tree(task):
+    """
+    Root parallelization worker: grow an independent tree for the position
+    Returns: (dict from root column to (visits, wins) of its child, (nodes, playouts, early terminations,
+        deepest moves on the board) of the search for the search stats)
+    """
+    ai_piece, player_piece, moves, num_playouts, playout_batch_size, seed = task
+    random.seed(seed)
+    ai = _get_worker_ai(ai_piece, player_piece)
+    ai.playout_batch_size = playout_batch_size
+    position = _position_from_moves(moves)
+    root = MCTSNode(None, None, player_piece, position.valid_moves())
+    counters = (ai.nodes, ai.playouts, ai.early_terminations)
+    ai.deepest_moves = position.num_moves
+    ai.grow_tree(root, position, num_playouts)
+    work = (ai.nodes - counters[0], ai.playouts - counters[1], ai.early_terminations - counters[2], ai.deepest_moves)
+    return {col: (child.visits, child.wins) for col, child in root.children.items()}, work
+
+
+def _simulate_leaf(task):
+    """
+    Tree parallelization worker: run the simulation step for a leaf of the shared tree
+    Returns: dict from winning piece (0 for a draw) to the number of games it won
+    """
+    ai_piece, player_piece, moves, playout_batch_size, seed = task
+    random.seed(seed)
+    ai = _get_worker_ai(ai_piece, player_piece)
+    ai.playout_batch_size = playout_batch_size
+    col, piece = moves[-1]
+    return ai.simulate_leaf(MCTSNode(None, col, piece, []), _position_from_moves(moves))
+
+
+class ParallelMCTS:
+    """
+    Monte Carlo Tree Search spread over several CPU cores.
+    - "root" mode: every worker grows its own tree for the position and the root moves are merged by visit count
+    - "tree" mode: one tree is kept in this process; each round selects one leaf per worker, with a virtual loss
+      on its path so the workers spread over the tree, and the workers run the playouts
+    Worker seeds are drawn from the random module and results are collected in task order, so a search is
+    reproducible under random.seed whatever worker runs each task.
+    """
+
+    def __init__(self, ai_algorithm_class, num_workers, mode="root", virtual_loss=1):
+        """
+        Args:
+            ai_algorithm_class: AIAlgorithm class the workers run
+            num_workers: number of worker processes
+            mode: "root" or "tree" parallelization
+            virtual_loss: games counted as lost on a path selected in tree mode until its playouts return
+        """
+        if mode not in ("root", "tree"):
+            raise ValueError(f"unknown parallel MCTS mode: {mode}")
+        self.num_workers = num_workers
+        self.mode = mode
+        self.virtual_loss = virtual_loss
+        self.pool = get_pool(ai_algorithm_class, num_workers)
+
+    def search(self, ai, position, num_playouts):
+        """
+        Best move for ai in position
+        Args:
+            ai: AIAlgorithm asking for the move, its playout_batch_size is used by the workers
+            position: Bitboard with ai to move
+            num_playouts: random games to play in total over all workers
+        Returns: the column with the most visits
+        """
+        if self.mode == "root":
+            return self.root_parallel_search(ai, position, num_playouts)
+        return self.tree_parallel_search(ai, position, num_playouts)
+
+    def root_parallel_search(self, ai, position, num_playouts):
+        playouts_per_worker = max(1, num_playouts // self.num_workers)
+        tasks = [(ai.AI_PIECE, ai.PLAYER_PIECE, position.history[:], playouts_per_worker, ai.playout_batch_size,
+                  random.getrandbits(32)) for _ in range(self.num_workers)]
+        visits, wins = {}, {}
+        for root_stats, (nodes, playouts, early_terminations, deepest_moves) in self.pool.map(_grow_root_tree, tasks):
+            for col, (child_visits, child_wins) in root_stats.items():
+                visits[col] = visits.get(col, 0) + child_visits
+                wins[col] = wins.get(col, 0) + child_wins
+            ai.nodes += nodes
+            ai.playouts += playouts
+            ai.early_terminations += early_terminations
+            ai.deepest_moves = max(ai.deepest_moves, deepest_moves)
+        # independent trees cannot be reused for the next move
+        ai.mcts_root = None
+        return max(visits, key=lambda col: (visits[col], wins[col]))
+
+    def tree_parallel_search(self, ai, position, num_playouts):
+        root = ai.reuse_tree(position)
+        start_moves = position.num_moves
+        played = 0
+        while played < num_playouts:
+            ai.check_clock()
+            # select one leaf per worker, the virtual losses stay on until the round's playouts are counted
+            leaves, tasks = [], []
+            for _ in range(self.num_workers):
+                node = ai.select_and_expand(root, position, self.virtual_loss)
+                if node.is_terminal:
+                    leaves.append((node, None))
+                else:
+                    leaves.append((node, len(tasks)))
+                    tasks.append((ai.AI_PIECE, ai.PLAYER_PIECE, position.history[:], ai.playout_batch_size,
+                                  random.getrandbits(32)))
+                position.undo_to(start_moves)
+
+            results = self.pool.map(_simulate_leaf, tasks) if tasks else []
+            for node, task_index in leaves:
+                # the workers' playouts are counted here for the search stats
+                if task_index is None:
+                    counts = {node.winner: ai.playout_batch_size}
+                    ai.early_terminations += 1
+                else:
+                    counts = results[task_index]
+                    ai.playouts += ai.playout_batch_size
+                ai.backpropagate(node, counts, self.virtual_loss)
+                played += ai.playout_batch_size
+
+        ai.mcts_root = root
+        ai.mcts_root_moves = position.history[:]
+        return root.most_visited_child().move
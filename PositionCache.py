@@ -0,0 +1,125 @@
+import os
+import time
+import sqlite3
+from Bitboard import NUM_COLUMNS
+from OpeningBook import canonical_key
+
+# cache file next to the modules, used when a cache is turned on without a path
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "position_cache.sqlite")
+# most results kept, the least recently used ones are evicted past it
+DEFAULT_MAX_ENTRIES = 1000000
+# puts between two checks of the cache size
+EVICTION_CHECK_INTERVAL = 256
+# eviction goes this fraction below max_entries so it does not run again on the next check
+EVICTION_SLACK = 0.1
+# a hit only rewrites its last use time when it is older than this many seconds, so readers rarely write
+TOUCH_INTERVAL_S = 60
+# seconds a process waits for another one's write to finish before giving up on a get or put
+LOCK_TIMEOUT_S = 5
+
+# caches opened in this process by path, a connection must not be used by a process forked after it was opened
+_open_caches = {}
+
+
+def open_cache(path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+    """PositionCache at path, opened once per process"""
+    key = (path, os.getpid())
+    if key not in _open_caches:
+        _open_caches[key] = PositionCache(path, max_entries)
+    return _open_caches[key]
+
+
+class PositionCache:
+    """
+    Search results kept on disk across runs in an SQLite file, keyed by the canonical key of the position
+    (the same for mirror images and either piece to move) and the search budget, so only a search with the
+    same settings is answered from it. The database runs in WAL mode: any number of processes read it while
+    one of them writes, and a busy database turns a get into a miss and a put into a no-op instead of an error.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            path: SQLite file, created if missing
+            max_entries: most results kept before the least recently used ones are evicted
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.puts_since_eviction = 0
+        # the GUI opens the cache on its main thread and searches on its AI worker thread, never both at once
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT_S, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # in WAL mode a commit only waits for the log, a crash may lose the last results but never corrupts
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (key INTEGER NOT NULL, budget TEXT NOT NULL, "
+                                "move INTEGER NOT NULL, score INTEGER NOT NULL, last_used REAL NOT NULL, "
+                                "PRIMARY KEY (key, budget)) WITHOUT ROWID")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def get(self, position, piece_to_move, budget):
+        """
+        Cached result of a search
+        Args:
+            position: Bitboard searched
+            piece_to_move: side to move in the position
+            budget: string naming the search and its settings, e.g. "minimax:200ms"
+        Returns: (best column, score for piece_to_move), None if the search is not cached
+        """
+        key, mirrored = canonical_key(position, piece_to_move)
+        try:
+            row = self.connection.execute("SELECT move, score, last_used FROM results WHERE key = ? AND budget = ?",
+                                          (key, budget)).fetchone()
+            if row is not None and time.time() - row[2] > TOUCH_INTERVAL_S:
+                self.connection.execute("UPDATE results SET last_used = ? WHERE key = ? AND budget = ?",
+                                        (time.time(), key, budget))
+        except sqlite3.OperationalError:
+            # locked by another process for longer than LOCK_TIMEOUT_S
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        col = row[0]
+        return (NUM_COLUMNS - 1 - col if mirrored else col), row[1]
+
+    def put(self, position, piece_to_move, budget, col, score):
+        """
+        Store the result of a search, evicting the least recently used results now and then
+        Args:
+            position: Bitboard searched
+            piece_to_move: side to move in the position
+            budget: string naming the search and its settings
+            col: best column found
+            score: score of the position for piece_to_move
+        """
+        key, mirrored = canonical_key(position, piece_to_move)
+        try:
+            self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                                    (key, budget, NUM_COLUMNS - 1 - col if mirrored else col, int(score), time.time()))
+            self.puts_since_eviction += 1
+            if self.puts_since_eviction >= EVICTION_CHECK_INTERVAL:
+                self.evict()
+        except sqlite3.OperationalError:
+            pass
+
+    def evict(self):
+        """Delete the least recently used results if there are more than max_entries"""
+        self.puts_since_eviction = 0
+        count = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * (1 - EVICTION_SLACK))
+        self.connection.execute("DELETE FROM results WHERE (key, budget) IN "
+                                "(SELECT key, budget FROM results ORDER BY last_used LIMIT ?)", (excess,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self):
+        self.connection.execute("DELETE FROM results")
+
+    def close(self):
+        self.connection.close()
+        _open_caches.pop((self.path, os.getpid()), None)
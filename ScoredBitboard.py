@@ -0,0 +1,93 @@
+from Bitboard import Bitboard, WINDOW_MASKS, ZOBRIST_KEYS, CENTER_MASK, HEIGHT, NUM_COLUMNS, NUM_WINDOWS, \
+    CELL_WINDOWS, WINDOW_SCORES, CENTER_WEIGHT, popcount
+
+# score gained by a window when its count goes from n to n + 1
+WINDOW_SCORE_GAINS = tuple(WINDOW_SCORES[count + 1] - WINDOW_SCORES[count] for count in range(4))
+CENTER_COLUMN = NUM_COLUMNS // 2
+
+
+class ScoredBitboard(Bitboard):
+    """
+    Bitboard that also keeps, for each piece, how many of its discs every window holds and its score_position
+    heuristic, updated on every play and undo, so a search leaf is scored without looking at the board.
+    Playing and undoing costs a pass over the windows through the cell, so only searches that score their
+    leaves use it; random playouts and the endgame solver stay on the plain Bitboard.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # window_counts[piece][w] is the number of piece's discs in window w, scores[piece] its heuristic score
+        self.window_counts = [None, [0] * NUM_WINDOWS, [0] * NUM_WINDOWS]
+        self.scores = [0, 0, 0]
+
+    @classmethod
+    def from_position(cls, position):
+        """
+        Scored copy of a Bitboard
+        Args:
+            position: the Bitboard to copy
+        Returns: the equivalent ScoredBitboard with its window counts and scores computed from scratch
+        """
+        scored = cls.__new__(cls)
+        scored.masks = position.masks[:]
+        scored.heights = position.heights[:]
+        scored.num_moves = position.num_moves
+        scored.hash = position.hash
+        scored.history = position.history[:]
+        scored.window_counts = [None] + [[popcount(scored.masks[piece] & window) for window in WINDOW_MASKS]
+                                         for piece in (1, 2)]
+        scored.scores = [0] + [popcount(scored.masks[piece] & CENTER_MASK) * CENTER_WEIGHT
+                               + sum(WINDOW_SCORES[count] for count in scored.window_counts[piece])
+                               for piece in (1, 2)]
+        return scored
+
+    def copy(self):
+        """Independent copy of the position, with its window counts and scores"""
+        position = ScoredBitboard.__new__(ScoredBitboard)
+        position.masks = self.masks[:]
+        position.heights = self.heights[:]
+        position.num_moves = self.num_moves
+        position.hash = self.hash
+        position.history = self.history[:]
+        position.window_counts = [None, self.window_counts[1][:], self.window_counts[2][:]]
+        position.scores = self.scores[:]
+        return position
+
+    def play(self, col, piece):
+        # same as Bitboard.play, written out to save a call on every search node
+        row = self.heights[col]
+        index = col * HEIGHT + row
+        self.masks[piece] |= 1 << index
+        self.hash ^= ZOBRIST_KEYS[piece][index]
+        self.heights[col] = row + 1
+        self.num_moves += 1
+        self.history.append((col, piece))
+        counts = self.window_counts[piece]
+        score = self.scores[piece]
+        for window in CELL_WINDOWS[index]:
+            count = counts[window]
+            score += WINDOW_SCORE_GAINS[count]
+            counts[window] = count + 1
+        if col == CENTER_COLUMN:
+            score += CENTER_WEIGHT
+        self.scores[piece] = score
+        return row
+
+    def undo(self):
+        col, piece = self.history.pop()
+        row = self.heights[col] - 1
+        index = col * HEIGHT + row
+        self.masks[piece] ^= 1 << index
+        self.hash ^= ZOBRIST_KEYS[piece][index]
+        self.heights[col] = row
+        self.num_moves -= 1
+        counts = self.window_counts[piece]
+        score = self.scores[piece]
+        for window in CELL_WINDOWS[index]:
+            count = counts[window] - 1
+            score -= WINDOW_SCORE_GAINS[count]
+            counts[window] = count
+        if col == CENTER_COLUMN:
+            score -= CENTER_WEIGHT
+        self.scores[piece] = score
+        return col
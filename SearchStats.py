@@ -0,0 +1,59 @@
+class SearchStats:
+    """
+    Work done by one AIAlgorithm search for a move, left in AIAlgorithm.last_search_stats when the search returns
+    """
+
+    def __init__(self, algorithm):
+        """
+        Args:
+            algorithm: name of the search ("minimax", "pvs", "endgame" or "mcts")
+        """
+        self.algorithm = algorithm
+        # positions searched by alpha-beta or the endgame solver, tree iterations for MCTS
+        self.nodes = 0
+        # alpha-beta and solver nodes that stopped early on a cutoff, and how many of them on their first move
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # depth of the last completed iteration (or the fixed depth) and the deepest ply any node reached
+        self.depth = 0
+        self.max_depth = 0
+        # random games played by MCTS
+        self.playouts = 0
+        # nodes where the game ended (a four in a row or a full board) before the depth or playout limit
+        self.early_terminations = 0
+        # transposition table probes and the ones that found the position
+        self.tt_probes = 0
+        self.tt_hits = 0
+        # whether the time budget ran out before the deepening finished
+        self.timed_out = False
+        self.wall_time_ms = 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        """Fraction of cutoffs caused by the first move tried, a measure of the move ordering"""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.wall_time_ms * 1000 if self.wall_time_ms else 0.0
+
+    def to_dict(self):
+        """JSON-serializable copy of the stats"""
+        return {
+            "algorithm": self.algorithm,
+            "nodes": self.nodes,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": round(self.first_move_cutoff_rate, 4),
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "playouts": self.playouts,
+            "early_terminations": self.early_terminations,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "timed_out": self.timed_out,
+            "wall_time_ms": round(self.wall_time_ms, 3)
+        }
+
+    def __repr__(self):
+        return f"SearchStats({', '.join(f'{key}={value}' for key, value in self.to_dict().items())})"
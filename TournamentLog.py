@@ -0,0 +1,56 @@
+import os
+import json
+
+
+class TournamentLog:
+    """
+    Append-only JSON lines log of finished tournament games, one game per line, flushed to disk as soon as
+    the game ends so an interrupted run loses at most the games still being played
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: log file, created if missing and appended to otherwise
+        """
+        self.path = path
+        self.repair()
+
+    def repair(self):
+        """Cut off a half-written last line left by a crash, so new games start on a line of their own"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as log_file:
+            content = log_file.read()
+            if content and not content.endswith(b"\n"):
+                log_file.truncate(content.rfind(b"\n") + 1)
+
+    def read_games(self):
+        """
+        Returns: list of the logged game records, in the order they finished
+        """
+        if not os.path.exists(self.path):
+            return []
+        games = []
+        with open(self.path) as log_file:
+            for line in log_file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    games.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # only a crash during the last write leaves a broken line
+                    continue
+        return games
+
+    def append(self, game):
+        """
+        Write one finished game to the log
+        Args:
+            game: JSON-serializable record of the game
+        """
+        with open(self.path, "a") as log_file:
+            log_file.write(json.dumps(game, separators=(",", ":")) + "\n")
+            log_file.flush()
+            os.fsync(log_file.fileno())
@@ -0,0 +1,109 @@
+# bound types of a stored score
+EXACT = 0
+LOWER_BOUND = 1  # search failed high, the real score is at least the stored one
+UPPER_BOUND = 2  # search failed low, the real score is at most the stored one
+
+# rough size of one stored entry (slot pointer, tuple and its ints) used to turn the memory cap into slots
+ENTRY_BYTES = 160
+
+
+class SlotTable:
+    """
+    Fixed number of slots holding entry tuples whose first item is their key. Every key maps to a
+    single slot and the number of slots is fixed by a memory cap, so memory never grows past it;
+    put replaces whatever the slot held.
+    """
+
+    def __init__(self, max_memory_mb, entry_bytes):
+        """
+        Args:
+            max_memory_mb: memory cap of the table in megabytes
+            entry_bytes: rough size of one stored entry
+        """
+        num_slots = max(1, int(max_memory_mb * 1024 * 1024) // entry_bytes)
+        # round down to a power of two so a slot is found by masking the key
+        self.size = 1 << (num_slots.bit_length() - 1)
+        self.index_mask = self.size - 1
+        self.slots = [None] * self.size
+
+    def get(self, key):
+        """Entry stored for a key, None if its slot is empty or holds another key"""
+        entry = self.slots[key & self.index_mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, entry):
+        """Store an entry in the slot of its key"""
+        self.slots[entry[0] & self.index_mask] = entry
+
+
+class TranspositionTable(SlotTable):
+    """
+    Fixed-size table of search results keyed by Zobrist hash. When two positions share a slot the one
+    from the current search or with the deeper result is kept.
+    """
+
+    def __init__(self, max_memory_mb=16):
+        """
+        Args:
+            max_memory_mb: memory cap of the table in megabytes
+        """
+        super().__init__(max_memory_mb, ENTRY_BYTES)
+        self.clear()
+
+    def clear(self):
+        """Drop every entry and reset the statistics"""
+        # each slot is None or a (key, depth, bound, score, move, generation) tuple
+        self.slots = [None] * self.size
+        self.generation = 0
+        self.num_entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def new_search(self):
+        """Mark entries stored so far as older than the next search's, so they are replaced first"""
+        self.generation += 1
+
+    def lookup(self, key):
+        """
+        Find the entry stored for a hash
+        Returns: (depth, bound, score, move) or None if the position is not stored
+        """
+        entry = self.slots[key & self.index_mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:5]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """
+        Store a search result, replacing the slot's entry only if it is for the same position,
+        left over from an earlier search or searched less deeply than this one
+        """
+        index = key & self.index_mask
+        entry = self.slots[index]
+        if entry is None:
+            self.num_entries += 1
+        elif entry[0] != key:
+            if entry[5] == self.generation and entry[1] > depth:
+                return
+            self.replacements += 1
+        self.slots[index] = (key, depth, bound, score, move, self.generation)
+        self.stores += 1
+
+    def get_stats(self):
+        """Hit and miss statistics of the table"""
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "entries": self.num_entries,
+            "size": self.size
+        }
@@ -0,0 +1,201 @@
+"""
+Checks that the fast evaluation paths give exactly the results of the plain loops they replaced, so a change
+to the bitboard or the evaluation tables can't silently change how the AI plays. Run with python -m pytest.
+"""
+import math
+import random
+import numpy as np
+import pytest
+from AIAlgorithm import AIAlgorithm, WIN_SCORE
+from Bitboard import Bitboard, NUM_ROWS, NUM_COLUMNS
+from ScoredBitboard import ScoredBitboard
+
+NUM_GAMES = 200
+
+
+def reference_score(board, piece):
+    """score_position as the original loops over rows, columns and diagonals computed it"""
+    def window_score(window):
+        return {4: 100, 3: 3, 2: 1}.get(window.count(piece), 0)
+
+    score = [board[r][3] for r in range(NUM_ROWS)].count(piece) * 3
+    for r in range(NUM_ROWS):
+        for c in range(NUM_COLUMNS - 3):
+            score += window_score([board[r][c + i] for i in range(4)])
+    for c in range(NUM_COLUMNS):
+        for r in range(NUM_ROWS - 3):
+            score += window_score([board[r + i][c] for i in range(4)])
+    for r in range(NUM_ROWS - 3):
+        for c in range(NUM_COLUMNS - 3):
+            score += window_score([board[r + i][c + i] for i in range(4)])
+            score += window_score([board[NUM_ROWS - 1 - r - i][c + i] for i in range(4)])
+    return score
+
+
+def reference_win(board, piece):
+    """Whether the piece has four in a row, checked cell by cell"""
+    for r in range(NUM_ROWS):
+        for c in range(NUM_COLUMNS):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                cells = [(r + i * dr, c + i * dc) for i in range(4)]
+                if all(0 <= row < NUM_ROWS and 0 <= col < NUM_COLUMNS and board[row][col] == piece
+                       for row, col in cells):
+                    return True
+    return False
+
+
+def random_positions(seed):
+    """Last positions of NUM_GAMES random games cut off after a random number of moves, some of them won"""
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(NUM_GAMES):
+        position = Bitboard()
+        piece = 1
+        for _ in range(rng.randint(0, NUM_ROWS * NUM_COLUMNS)):
+            if position.is_full():
+                break
+            position.play(rng.choice(position.valid_moves()), piece)
+            piece = 3 - piece
+            if position.last_move_wins():
+                break
+        positions.append(position)
+    return positions
+
+
+@pytest.mark.parametrize("piece", [1, 2])
+def test_array_score_position_matches_loops(piece):
+    ai = AIAlgorithm(2, 1)
+    for position in random_positions(1):
+        board = position.to_array()
+        assert ai.score_position(board, piece) == reference_score(board, piece)
+        assert ai.score_position(position, piece) == reference_score(board, piece)
+
+
+@pytest.mark.parametrize("piece", [1, 2])
+def test_array_check_win_matches_loops(piece):
+    ai = AIAlgorithm(2, 1)
+    for position in random_positions(2):
+        board = position.to_array()
+        expected = reference_win(board, piece)
+        assert ai.check_win(board, piece, NUM_COLUMNS, NUM_ROWS) == expected
+        assert ai.check_win(position, piece, NUM_COLUMNS, NUM_ROWS) == expected
+
+
+def test_check_win_marks_a_winning_line():
+    ai = AIAlgorithm(2, 1)
+    ai.game_over = True
+    for position in random_positions(3):
+        board = position.to_array()
+        for piece in (1, 2):
+            ai.winning_pieces = []
+            if ai.check_win(board, piece, NUM_COLUMNS, NUM_ROWS):
+                assert len(ai.winning_pieces) == 4
+                assert all(board[row][col] == piece for row, col in ai.winning_pieces)
+
+
+def test_evaluate_boards_matches_loops():
+    ai = AIAlgorithm(2, 1)
+    boards = np.array([position.to_array() for position in random_positions(4)])
+    scores, winners, terminal = ai.evaluate_boards(boards, chunk_size=64)
+    for board, score, winner, over in zip(boards, scores, winners, terminal):
+        assert score == reference_score(board, 2)
+        expected_winner = 1 if reference_win(board, 1) else 2 if reference_win(board, 2) else 0
+        assert winner == expected_winner
+        assert over == (expected_winner != 0 or bool((board != 0).all()))
+
+
+def test_scored_bitboard_keeps_score_position():
+    rng = random.Random(5)
+    for _ in range(NUM_GAMES):
+        position = ScoredBitboard()
+        piece = 1
+        for _ in range(rng.randint(1, NUM_ROWS * NUM_COLUMNS)):
+            if position.is_full():
+                break
+            position.play(rng.choice(position.valid_moves()), piece)
+            piece = 3 - piece
+            if position.num_moves and rng.random() < 0.2:
+                position.undo()
+                piece = 3 - piece
+            if rng.random() < 0.1:
+                position = position.copy()
+            if rng.random() < 0.05:
+                position = ScoredBitboard.from_position(Bitboard.copy(position))
+            board = position.to_array()
+            assert position.scores[1] == reference_score(board, 1)
+            assert position.scores[2] == reference_score(board, 2)
+
+
+def reference_minimax(position, depth, maximizing, ai_piece):
+    """Plain minimax without pruning, scoring wins like the original: a move that wins ends the search"""
+    if depth == 0:
+        return reference_score(position.to_array(), ai_piece)
+    piece = ai_piece if maximizing else 3 - ai_piece
+    values = []
+    for col in position.valid_moves():
+        position.play(col, piece)
+        if position.last_move_wins():
+            value = WIN_SCORE if maximizing else -WIN_SCORE
+        elif position.is_full():
+            value = 0
+        else:
+            value = reference_minimax(position, depth - 1, not maximizing, ai_piece)
+        position.undo()
+        values.append(value)
+    return max(values) if maximizing else min(values)
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3, 4])
+def test_minimax_matches_plain_minimax(depth):
+    for position in random_positions(6)[:40]:
+        if position.is_full() or position.has_won(1) or position.has_won(2):
+            continue
+        ai_piece = 1 + position.num_moves % 2
+        # the solver is turned off so every position runs the heuristic search
+        ai = AIAlgorithm(ai_piece, 3 - ai_piece, endgame_threshold=0)
+        _, value = ai.minimax(position.copy(), depth, -np.inf, np.inf, True)
+        assert value == reference_minimax(position, depth, True, ai_piece)
+
+
+def brute_force_negamax(position, piece):
+    """
+    Exact solver score for the side to move without pruning or caching: a win scores the empty cells left
+    after the winning disc plus one
+    """
+    best = -math.inf
+    for col in position.valid_moves():
+        position.play(col, piece)
+        if position.last_move_wins():
+            value = NUM_ROWS * NUM_COLUMNS - position.num_moves + 1
+        elif position.is_full():
+            value = 0
+        else:
+            value = -brute_force_negamax(position, 3 - piece)
+        position.undo()
+        best = max(best, value)
+    return best
+
+
+def endgame_positions(seed, count, empty_cells):
+    """count positions of random games with empty_cells cells left, nobody having won yet"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Bitboard()
+        piece = 1
+        while NUM_ROWS * NUM_COLUMNS - position.num_moves > empty_cells:
+            position.play(rng.choice(position.valid_moves()), piece)
+            piece = 3 - piece
+            if position.last_move_wins():
+                break
+        else:
+            positions.append((position, piece))
+    return positions
+
+
+# a cache of a few slots makes nearly every store replace another position
+@pytest.mark.parametrize("endgame_cache_mb", [0.001, 16])
+def test_endgame_solver_matches_brute_force(endgame_cache_mb):
+    for position, piece in endgame_positions(7, 20, 10):
+        ai = AIAlgorithm(piece, 3 - piece, endgame_cache_mb=endgame_cache_mb)
+        assert ai._solve(position.copy(), -math.inf, math.inf, piece) == brute_force_negamax(position, piece)